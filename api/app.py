@@ -1,39 +1,476 @@
-from fastapi import FastAPI, UploadFile, File
-from fastapi.responses import JSONResponse
-import pandas as pd
+from fastapi import FastAPI, UploadFile, File, Query, HTTPException
+from fastapi.responses import StreamingResponse, Response
+from pydantic import BaseModel, Field
+from typing import List, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import asyncio
 import io
+import json
+import logging
 import os
 import sys
+import threading
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SRC_PATH = os.path.join(BASE_DIR, 'src')
 DATA_PATH = os.path.join(BASE_DIR, 'data')
-MODEL_PATH = os.path.join(BASE_DIR, 'models', 'model.pkl')
+MODEL_PATH = os.environ.get('MODEL_PATH', os.path.join(BASE_DIR, 'models', 'model.pkl'))
+PREPROCESSOR_PATH = os.path.join(BASE_DIR, 'models', 'preprocessor.pkl')
+DRIFT_BASELINE_PATH = os.path.join(DATA_PATH, 'processed', 'drift_baseline.json')
+REGISTRY_PATH = os.environ.get('MODEL_REGISTRY', os.path.join(BASE_DIR, 'models', 'registry'))
+
+PREDICT_BLOCK_BYTES = int(os.environ.get('PREDICT_BLOCK_MB', 4)) * 1024 ** 2
+SCORING_WORKERS = int(os.environ.get('SCORING_WORKERS', os.cpu_count() or 1))
+MAX_SCORE_RECORDS = int(os.environ.get('MAX_SCORE_RECORDS', 1_000))
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 0))
+PREDICTION_CACHE_TTL = float(os.environ.get('PREDICTION_CACHE_TTL', 3600))
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'lightgbm')
+DRIFT_MONITOR = os.environ.get('DRIFT_MONITOR', '1') == '1' and os.path.exists(DRIFT_BASELINE_PATH)
+REGISTRY_POLL_SECONDS = float(os.environ.get('REGISTRY_POLL_SECONDS', 2))
+SHADOW_SAMPLE_RATE = float(os.environ.get('SHADOW_SAMPLE_RATE', 0.1))
+SHADOW_QUEUE_SIZE = int(os.environ.get('SHADOW_QUEUE_SIZE', 64))
 
 if SRC_PATH not in sys.path:
     sys.path.insert(0, SRC_PATH)
 
-from predict import RiskPredictor
+from predict import FUERA_RANGO, RiskPredictor
+from registry import ModelRegistry, ShadowScorer
+from schema import SchemaError, iter_raw
 from data_preprocesing import ModelPreprocessor
+from cache import PredictionCache
+from monitoring import DriftMonitor, load_baseline
+from metrics import StageTimer, stage, latest
+
+registry = ModelRegistry(REGISTRY_PATH)
+logger = logging.getLogger(__name__)
+_predictor = None
+_champion = None
+_shadow = None
+_registry_stamp = None
+_predictor_lock = threading.Lock()
+
+
+def _load_predictor(version, cache=None, monitor=None) -> RiskPredictor:
+    # Sin champion en el registro se usa el modelo de models/ (comportamiento original)
+    if version is None:
+        return RiskPredictor(model_path=MODEL_PATH, preprocessor=ModelPreprocessor.load(PREPROCESSOR_PATH),
+                             cache=cache, monitor=monitor, backend=INFERENCE_BACKEND)
+    return registry.load(version, cache=cache, monitor=monitor, backend=INFERENCE_BACKEND)
+
+
+def _sync_registry(wait=False):
+    # Lee los alias del registro y, si cambiaron, carga el nuevo champion (modelo y preprocesamiento)
+    # antes de reemplazar la referencia: las solicitudes en curso terminan con el predictor que
+    # tomaron y las nuevas usan el nuevo, sin reiniciar el servicio. Si la versión nueva no carga
+    # se registra el error y se sigue sirviendo la actual; el cambio de alias no se reintenta.
+    global _predictor, _champion, _registry_stamp
+    if not _predictor_lock.acquire(blocking=wait or _predictor is None):
+        return
+    try:
+        stamp = registry.stamp()
+        if _predictor is not None and stamp == _registry_stamp:
+            return
+        champion = (registry.alias('champion') or {}).get('version')
+        if _predictor is None or champion != _champion:
+            actual = _predictor
+            try:
+                nuevo = _load_predictor(
+                    champion,
+                    cache=actual.cache if actual is not None else (
+                        PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL) if PREDICTION_CACHE_SIZE > 0 else None),
+                    monitor=actual.monitor if actual is not None else (
+                        DriftMonitor(load_baseline(DRIFT_BASELINE_PATH)) if DRIFT_MONITOR else None),
+                )
+            except Exception:
+                if actual is None:
+                    raise
+                logger.exception("No se pudo cargar el champion %s; se mantiene %s", champion, _champion)
+            else:
+                _predictor, _champion = nuevo, champion
+        _sync_shadow(registry.alias('challenger'))
+        _registry_stamp = stamp
+    finally:
+        _predictor_lock.release()
+
+
+def _sync_shadow(challenger):
+    global _shadow
+    version = challenger['version'] if challenger else None
+    tasa = challenger.get('tasa_muestreo', SHADOW_SAMPLE_RATE) if challenger else None
+    if _shadow is not None and (_shadow.version, _shadow.sample_rate) == (version, tasa):
+        return
+    anterior, _shadow = _shadow, None
+    if anterior is not None:
+        # El hilo anterior termina lo ya encolado sin bloquear esta solicitud
+        threading.Thread(target=anterior.close, daemon=True).start()
+    if version is not None and tasa > 0:
+        try:
+            retador = registry.load(version, backend=INFERENCE_BACKEND)
+        except Exception:
+            logger.exception("No se pudo cargar el challenger %s; puntuación en sombra deshabilitada", version)
+            return
+        retador.n_threads = 1
+        grupos = _predictor.buckets['grupo'].tolist() + [FUERA_RANGO]
+        _shadow = ShadowScorer(retador, version, grupos, sample_rate=tasa, max_queue=SHADOW_QUEUE_SIZE)
+
+
+def _poll_registry(detener: threading.Event):
+    # Hilo de fondo: cada REGISTRY_POLL_SECONDS revisa los alias (un stat por alias) y carga las
+    # versiones nuevas fuera del event loop, así todos los workers siguen al champion
+    while not detener.wait(REGISTRY_POLL_SECONDS):
+        try:
+            _sync_registry()
+        except Exception:
+            logger.exception("Error al revisar el registro de modelos")
+
+
+def get_predictor() -> RiskPredictor:
+    # El modelo se carga al arrancar el servidor (lifespan) o en la primera solicitud,
+    # nunca como efecto secundario de importar el módulo
+    if _predictor is None:
+        _sync_registry()
+    return _predictor
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_predictor()
+    detener = threading.Event()
+    poller = threading.Thread(target=_poll_registry, args=(detener,), name='registry-poll', daemon=True)
+    poller.start()
+    yield
+    detener.set()
+    poller.join(timeout=5)
+    if _shadow is not None:
+        _shadow.close(timeout=5)
+
 
 app = FastAPI(
     title="API Predicción de Riesgo de Crédito",
     description="Clasifica clientes en grupos de riesgo t1 a t8 con base en modelo entrenado",
-    version="1.0"
+    version="1.0",
+    lifespan=lifespan,
 )
 
-preprocessor = ModelPreprocessor(apply_cleaning=True, balanceo=False)
-predictor = RiskPredictor(
-    model_path=MODEL_PATH,
-    preprocessor=preprocessor,
-)
+
+class Solicitante(BaseModel):
+    num_doc: Optional[float] = None
+    f_analisis: Optional[int] = None
+    tipo_cliente: Optional[str] = None
+    trx39: Optional[float] = None
+    trx102: Optional[float] = None
+    trx106: Optional[float] = None
+    trx143: Optional[float] = None
+    trx158: Optional[float] = None
+    disp309: Optional[float] = None
+    CO01END010RO: Optional[float] = None
+    CO01ACP017CC: Optional[float] = None
+    CO02EXP011TO: Optional[float] = None
+    CO02EXP004TO: Optional[float] = None
+    CO01EXP001CC: Optional[float] = None
+    CO01EXP003RO: Optional[float] = None
+    CO02END015CC: Optional[float] = None
+    CO01END002RO: Optional[float] = None
+    CO01END086RO: Optional[float] = None
+    CO01END094RO: Optional[float] = None
+    CO02NUM086AH: Optional[float] = None
+    CO02NUM043RO: Optional[float] = None
+    CO01EXP002AH: Optional[float] = None
+    CO01NUM002AH: Optional[float] = None
+    CO01END051RO: Optional[float] = None
+    CO01ACP011RO: Optional[float] = None
+    CO02MOR092TO: Optional[float] = None
+    CO01MOR098RO: Optional[float] = None
+
+
+class Razon(BaseModel):
+    variable: str
+    aporte: float = Field(description="Contribución al puntaje en log-odds (positiva: sube la PD)")
+
+
+class Puntaje(BaseModel):
+    num_doc: Optional[float] = None
+    probabilidad: float
+    grupo_riesgo: str = Field(description="Grupo de riesgo t1 a t8 o fuera_rango")
+    razones: Optional[List[Razon]] = None
+
+
+# Pool acotado para el trabajo de CPU: el event loop solo coordina E/S
+scoring_executor = ThreadPoolExecutor(max_workers=SCORING_WORKERS, thread_name_prefix='scoring')
+
+MAX_RAZONES = 10
+RAZONES_DOC = "Códigos de razón por cliente: las k variables de buró que más suben su PD"
+RAZONES_GRUPOS_DOC = "Explica solo estos grupos de riesgo (p. ej. t6, t7, t8); por defecto todos"
+
+MEDIA_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+
+def _open_upload(source):
+    # Acepta el archivo plano o comprimido con gzip (firma 1f 8b, sin depender del nombre):
+    # pyarrow descomprime por bloques a medida que se lee, sin cargar el archivo completo
+    if source.read(2) != b'\x1f\x8b':
+        source.seek(0)
+        return source
+    import pyarrow as pa
+
+    source.seek(0)
+    return pa.CompressedInputStream(pa.PythonFile(source, mode='r'), 'gzip')
+
+
+def _iter_scored_chunks(source, timer, predictor, shadow, razones=0, grupos_razones=None):
+    preprocessor = predictor.preprocessor
+    chunks = iter_raw(source, block_size=PREDICT_BLOCK_BYTES,
+                      required=['num_doc'] + preprocessor.num_cols + preprocessor.cat_cols)
+    try:
+        while True:
+            with stage('lectura'):
+                try:
+                    chunk = next(chunks, None)
+                except SchemaError as exc:
+                    raise HTTPException(status_code=422, detail=str(exc)) from exc
+                except (ValueError, OSError) as exc:
+                    # CSV mal formado, valores que no corresponden al esquema o gzip corrupto
+                    raise HTTPException(status_code=400, detail=f"Archivo inválido: {exc}") from exc
+            if chunk is None:
+                break
+            df_result = predictor.predict_from_dataframe(chunk, razones, grupos_razones)
+            if shadow is not None:
+                shadow.submit(chunk, df_result)
+            timer.add_rows(len(df_result))
+            yield df_result
+    finally:
+        source.close()
+
+
+def _encode_ndjson(chunks):
+    for df_result in chunks:
+        with stage('serializacion'):
+            data = df_result.to_json(orient='records', lines=True).rstrip('\n').encode('utf-8') + b'\n'
+        yield data
+
+
+def _encode_csv(chunks):
+    header = True
+    for df_result in chunks:
+        with stage('serializacion'):
+            data = df_result.to_csv(index=False, header=header).encode('utf-8')
+        yield data
+        header = False
+
+
+def _encode_arrow(chunks):
+    import pyarrow as pa
+
+    sink = io.BytesIO()
+    writer = None
+    for df_result in chunks:
+        with stage('serializacion'):
+            batch = pa.RecordBatch.from_pandas(df_result, preserve_index=False)
+            if writer is None:
+                writer = pa.ipc.new_stream(sink, batch.schema)
+            writer.write_batch(batch)
+        yield _drain(sink)
+    if writer is not None:
+        writer.close()
+        yield _drain(sink)
+
+
+def _drain(buffer: io.BytesIO) -> bytes:
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+ENCODERS = {'ndjson': _encode_ndjson, 'csv': _encode_csv, 'arrow': _encode_arrow}
+
+
+def _step(iterator, timer):
+    # Cada paso puede correr en un hilo distinto del pool: el temporizador se activa por paso
+    with timer.activo():
+        return next(iterator, None)
+
+
+async def _offload(iterator, timer, formato, primero):
+    # primero: el bloque ya puntuado antes de enviar los encabezados. Un error posterior no puede
+    # cambiar el código HTTP: en NDJSON se cierra con un registro {"error": ...}; en CSV y Arrow
+    # se aborta la conexión, así el cliente no toma el resultado parcial como completo
+    loop = asyncio.get_running_loop()
+    try:
+        data = primero
+        while data is not None:
+            yield data
+            data = await loop.run_in_executor(scoring_executor, _step, iterator, timer)
+    except Exception as exc:
+        logger.exception("Error a mitad del stream de /predict/")
+        if formato != 'ndjson':
+            raise
+        detalle = exc.detail if isinstance(exc, HTTPException) else f"Error al puntuar el archivo: {exc}"
+        yield json.dumps({'error': detalle}, ensure_ascii=False).encode('utf-8') + b'\n'
+    finally:
+        timer.finish()
+
 
 @app.post("/predict/")
-async def predict_riesgo(file: UploadFile = File(...)):
-    contents = await file.read()
-    df = pd.read_csv(io.BytesIO(contents), sep='|', encoding='utf-8')
-    df_resultado = predictor.predict_from_dataframe(df)
-    return df_resultado
+async def predict_riesgo(file: UploadFile = File(...),
+                         formato: str = Query('ndjson', description="ndjson, csv o arrow"),
+                         razones: int = Query(0, ge=0, le=MAX_RAZONES, description=RAZONES_DOC),
+                         razones_grupos: Optional[List[str]] = Query(None, description=RAZONES_GRUPOS_DOC)):
+    if formato not in ENCODERS:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado: {formato}")
+
+    # FastAPI cierra el UploadFile al retornar el endpoint; la respuesta se genera
+    # después, así que se toma el archivo temporal y se cierra al terminar el stream.
+    source, file.file = file.file, io.BytesIO()
+    source.seek(0)
+    source = _open_upload(source)
+
+    # Todo el archivo se puntúa con el champion vigente al recibirlo, aunque cambie a mitad del stream.
+    # La carga inicial (si el lifespan no la hizo) corre fuera del event loop
+    predictor = _predictor if _predictor is not None else await asyncio.to_thread(get_predictor)
+    timer = StageTimer('predict')
+    chunks = ENCODERS[formato](_iter_scored_chunks(source, timer, predictor, _shadow, razones, razones_grupos))
+    # El encabezado se valida y el primer bloque se puntúa antes de responder: los errores del
+    # archivo llegan como 400/422 y los del modelo como 500, no como un 200 vacío
+    try:
+        primero = await asyncio.get_running_loop().run_in_executor(scoring_executor, _step, chunks, timer)
+    except HTTPException:
+        timer.finish()
+        raise
+    except Exception as exc:
+        timer.finish()
+        logger.exception("Error al puntuar el primer bloque de /predict/")
+        raise HTTPException(status_code=500, detail=f"Error al puntuar el archivo: {exc}") from exc
+    return StreamingResponse(_offload(chunks, timer, formato, primero), media_type=MEDIA_TYPES[formato])
+
+
+@app.post("/score", response_model=List[Puntaje], response_model_exclude_unset=True)
+def score_solicitantes(solicitantes: Union[Solicitante, List[Solicitante]],
+                       razones: int = Query(0, ge=0, le=MAX_RAZONES, description=RAZONES_DOC),
+                       razones_grupos: Optional[List[str]] = Query(None, description=RAZONES_GRUPOS_DOC)):
+    if not isinstance(solicitantes, list):
+        solicitantes = [solicitantes]
+    if not solicitantes:
+        return []
+    if len(solicitantes) > MAX_SCORE_RECORDS:
+        raise HTTPException(status_code=413,
+                            detail=f"Máximo {MAX_SCORE_RECORDS} registros por solicitud; use /predict/")
+    predictor, shadow = get_predictor(), _shadow
+    registros = [s.model_dump() for s in solicitantes]
+    timer = StageTimer('score')
+    with timer.activo():
+        puntajes = predictor.score_records(registros, razones, razones_grupos)
+    if shadow is not None:
+        shadow.submit_records(registros, puntajes)
+    timer.add_rows(len(puntajes))
+    timer.finish()
+    return puntajes
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    cache = get_predictor().cache
+    if cache is None:
+        return {'enabled': False}
+    return {'enabled': True, **cache.stats()}
+
+
+@app.get("/metrics")
+def metrics():
+    exposicion = latest()
+    if exposicion is None:
+        raise HTTPException(status_code=404, detail="prometheus_client no está instalado")
+    data, content_type = exposicion
+    return Response(content=data, media_type=content_type)
+
+
+@app.get("/monitoring/drift")
+def drift_report():
+    monitor = get_predictor().monitor
+    if monitor is None:
+        return {'enabled': False}
+    return {'enabled': True, **monitor.report()}
+
+
+@app.post("/monitoring/drift/reset")
+def drift_reset():
+    monitor = get_predictor().monitor
+    if monitor is None:
+        raise HTTPException(status_code=404, detail="Monitoreo de estabilidad deshabilitado")
+    monitor.reset()
+    return {'enabled': True, 'n': 0}
+
+
+class Asignacion(BaseModel):
+    version: str
+    tasa_muestreo: Optional[float] = Field(default=None, gt=0, le=1,
+                                           description="Solo challenger: fracción de filas puntuadas en sombra")
+
+
+def _version_info(version):
+    if version is None:
+        return {'version': None, 'model_path': MODEL_PATH}
+    return registry.metadata(version)
+
+
+@app.get("/models")
+def models():
+    get_predictor()
+    return {
+        'champion': _version_info(_champion),
+        'challenger': registry.alias('challenger'),
+        'versiones': registry.versions(),
+    }
+
+
+@app.put("/models/champion")
+def set_champion(asignacion: Asignacion):
+    # Promoción en caliente: se carga la versión y se reemplaza el predictor sin reiniciar
+    try:
+        registry.set_alias('champion', asignacion.version)
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    _sync_registry(wait=True)
+    if _champion != asignacion.version:
+        raise HTTPException(status_code=500, detail=f"No se pudo cargar la versión {asignacion.version}; "
+                                                    f"se mantiene el champion {_champion}")
+    return _version_info(_champion)
+
+
+@app.put("/models/challenger")
+def set_challenger(asignacion: Asignacion):
+    opciones = {'tasa_muestreo': asignacion.tasa_muestreo} if asignacion.tasa_muestreo is not None else {}
+    try:
+        registry.set_alias('challenger', asignacion.version, **opciones)
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    _sync_registry(wait=True)
+    return shadow_stats()
+
+
+@app.delete("/models/challenger")
+def clear_challenger():
+    registry.clear_alias('challenger')
+    _sync_registry(wait=True)
+    return {'enabled': False}
+
 
+@app.get("/models/shadow")
+def shadow_stats():
+    get_predictor()
+    if _shadow is None:
+        return {'enabled': False}
+    return {'enabled': True, **_shadow.stats()}
 
 
+@app.post("/models/shadow/reset")
+def shadow_reset():
+    if _shadow is None:
+        raise HTTPException(status_code=404, detail="No hay challenger en sombra")
+    _shadow.reset()
+    return {'enabled': True, **_shadow.stats()}
@@ -0,0 +1,109 @@
+# Backtesting multi-periodo: celda de notebook (transformar y calcular métricas por periodo con
+# sklearn/scipy, bootstrap con remuestreo explícito) vs. BacktestEngine (matrices en caché,
+# periodos en paralelo, métricas vectorizadas con todas las réplicas de bootstrap a la vez)
+import argparse
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from scipy.stats import ks_2samp
+from sklearn.metrics import roc_auc_score
+
+from backtest import BacktestEngine
+from bench_suite import portafolio_sintetico
+from export_model import native_model
+from predict import BACKENDS, RiskPredictor
+from schema import read_raw
+
+
+def backtest_notebook(predictor, df, n_bootstrap, rng):
+    # Devuelve (segundos de transformación y puntuación, segundos de métricas)
+    t_puntuar = t_metricas = 0.0
+    for _, parte in df.groupby('f_analisis'):
+        t0 = time.perf_counter()
+        X, y = predictor.preprocessor.transform(parte)
+        probs = predictor._predict_model(X)
+        t1 = time.perf_counter()
+        y = y.to_numpy()
+        roc_auc_score(y, probs)
+        ks_2samp(probs[y == 1], probs[y == 0])
+        aucs = []
+        for _ in range(n_bootstrap):
+            idx = rng.integers(0, len(y), len(y))
+            aucs.append(roc_auc_score(y[idx], probs[idx]))
+        np.percentile(aucs, [2.5, 97.5]) if aucs else None
+        grupos = predictor.asignar_grupos(probs)
+        parte.loc[X.index].assign(pd=probs, grupo=grupos).groupby('grupo', observed=True).agg(
+            n=('pd', 'size'), pd_media=('pd', 'mean'), tasa_default=('default', 'mean'))
+        t_puntuar += t1 - t0
+        t_metricas += time.perf_counter() - t1
+    return t_puntuar, t_metricas
+
+
+def verificar_sin_respuesta(predictor, df):
+    # Cohortes recientes sin madurar: 'default' en blanco se rechaza con el conteo por periodo,
+    # o se descarta con descartar_sin_respuesta=True
+    df = df.astype({'default': 'float64'})
+    df.loc[df.index[-50:], 'default'] = np.nan
+    periodo = df['f_analisis'].iloc[-1]
+    try:
+        BacktestEngine(predictor, cache_dir=None).cargar_dataframe(df)
+    except ValueError as exc:
+        assert '50 filas' in str(exc) and str(periodo) in str(exc), exc
+    else:
+        raise AssertionError("Se aceptaron filas sin variable respuesta")
+    engine = BacktestEngine(predictor, cache_dir=None, descartar_sin_respuesta=True).cargar_dataframe(df)
+    assert len(engine.y) == len(df) - 50
+    print("sin respuesta: rechazo con conteo por periodo y descarte de 50 filas")
+
+
+def cronometrar(fn):
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--filas', type=int, default=240_000)
+    parser.add_argument('--periodos', type=int, default=12)
+    parser.add_argument('--bootstrap', type=int, default=100)
+    parser.add_argument('--backend', choices=BACKENDS, default='lightgbm')
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')
+    predictor = RiskPredictor(native_model(), backend=args.backend)
+    base = read_raw(os.path.join(ROOT, 'data', 'raw', 'base_validacion.csv'))
+    rng = np.random.default_rng(42)
+    df = portafolio_sintetico(base, args.filas, rng)
+    df['f_analisis'] = 201901 + rng.integers(0, args.periodos, len(df))
+
+    verificar_sin_respuesta(predictor, df.iloc[:20_000])
+    nb_puntuar, nb_metricas = backtest_notebook(predictor, df, args.bootstrap, np.random.default_rng(0))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'backtest.csv')
+        df.to_csv(path, sep='|', index=False)
+        t_frio = cronometrar(lambda: BacktestEngine(predictor, cache_dir=tmp).cargar(path))
+        engine = BacktestEngine(predictor, cache_dir=tmp)
+        t_cache = cronometrar(lambda: engine.cargar(path))
+        t_puntuar = cronometrar(engine.puntuar)
+        t_metricas = cronometrar(lambda: engine.run(n_bootstrap=args.bootstrap))
+        t_sin_bootstrap = cronometrar(engine.run)
+
+    total = t_cache + t_puntuar + t_metricas
+    print(f"{args.filas:,} filas, {args.periodos} periodos, {args.bootstrap} réplicas de bootstrap, backend {args.backend}")
+    print(f"notebook:  transformación y puntuación {nb_puntuar:7.2f} s  métricas {nb_metricas:7.2f} s  "
+          f"total {nb_puntuar + nb_metricas:7.2f} s")
+    print(f"engine:    lectura y transformación {t_frio:7.2f} s (en caché {t_cache:.2f} s)  puntuación {t_puntuar:7.2f} s  "
+          f"métricas {t_metricas:7.2f} s (sin bootstrap {t_sin_bootstrap:.3f} s)")
+    print(f"speedup:   métricas {nb_metricas / t_metricas:.1f}x  total con matrices en caché "
+          f"{(nb_puntuar + nb_metricas) / total:.1f}x")
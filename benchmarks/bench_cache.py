@@ -0,0 +1,68 @@
+# Caché de predicciones por huella de fila: lote repetido con y sin caché, y verificación del
+# cambio de champion en caliente (el predictor anterior termina una solicitud en curso después
+# de que el nuevo tomó la caché compartida: no debe dejarle PDs viejas)
+import argparse
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_suite import portafolio_sintetico
+from cache import PredictionCache
+from config import MODEL_PATH
+from export_model import native_model
+from predict import RiskPredictor
+from schema import read_raw
+
+
+def verificar_cambio_en_caliente(df, tmp):
+    # Modelo "nuevo": el mismo ensamble truncado, con probabilidades distintas
+    import lightgbm as lgb
+
+    nuevo_path = os.path.join(tmp, 'model_nuevo.txt')
+    booster = lgb.Booster(model_file=native_model())
+    booster.save_model(nuevo_path, num_iteration=max(1, booster.num_trees() // 2))
+
+    cache = PredictionCache(max_size=len(df) * 4)
+    anterior = RiskPredictor(MODEL_PATH, cache=cache)
+    anterior.predict_from_dataframe(df)
+    nuevo = RiskPredictor(nuevo_path, cache=cache)
+    # Solicitud en curso del champion anterior que termina después del cambio
+    anterior.predict_from_dataframe(df.iloc[::-1])
+    hits = cache.hits
+    resultado = nuevo.predict_from_dataframe(df)['probabilidad'].to_numpy()
+    esperado = RiskPredictor(nuevo_path).predict_from_dataframe(df)['probabilidad'].to_numpy()
+    assert cache.hits == hits, f"{cache.hits - hits} aciertos viejos para la versión nueva"
+    assert np.allclose(resultado, esperado), "La versión nueva recibió PDs del modelo anterior"
+    print(f"cambio en caliente: 0 aciertos viejos, {len(df):,} PDs de la versión nueva")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--filas', type=int, default=100_000)
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')
+    base = read_raw(os.path.join(ROOT, 'data', 'raw', 'base_validacion.csv'))
+    df = portafolio_sintetico(base, args.filas, np.random.default_rng(42))
+
+    sin_cache = RiskPredictor(MODEL_PATH)
+    con_cache = RiskPredictor(MODEL_PATH, cache=PredictionCache(max_size=args.filas))
+    t0 = time.perf_counter()
+    sin_cache.predict_from_dataframe(df)
+    t_sin = time.perf_counter() - t0
+    con_cache.predict_from_dataframe(df)
+    t0 = time.perf_counter()
+    con_cache.predict_from_dataframe(df)
+    t_con = time.perf_counter() - t0
+    print(f"{args.filas:,} filas  sin caché {t_sin:.2f} s  todo en caché {t_con:.2f} s ({t_sin / t_con:.1f}x)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        verificar_cambio_en_caliente(df.iloc[:5_000], tmp)
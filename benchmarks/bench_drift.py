@@ -0,0 +1,54 @@
+# Costo del monitor de estabilidad (PSI/CSI) sobre la ruta de puntuación
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from config import MODEL_PATH
+from monitoring import DriftMonitor, load_baseline
+from predict import RiskPredictor
+from schema import read_raw
+
+
+def medir(fn, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - t0)
+    return float(np.median(tiempos))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--filas', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')
+    base = read_raw(os.path.join(ROOT, 'data', 'raw', 'base_prueba.csv'))
+    sin_monitor = RiskPredictor(MODEL_PATH)
+    con_monitor = RiskPredictor(MODEL_PATH, preprocessor=sin_monitor.preprocessor,
+                                monitor=DriftMonitor(load_baseline()))
+
+    for filas in args.filas:
+        df = pd.concat([base] * (filas // len(base) + 1), ignore_index=True).iloc[:filas]
+        grupos = sin_monitor.predict_from_dataframe(df)['grupo_riesgo'].values
+        t_base = medir(lambda: sin_monitor.predict_from_dataframe(df), args.repeticiones)
+        t_monitor = medir(lambda: con_monitor.monitor.update(df, grupos), args.repeticiones)
+        print(f"{filas:>10,} filas  puntuación={t_base * 1000:9.1f} ms  monitor={t_monitor * 1000:7.2f} ms  "
+              f"sobrecosto={100 * t_monitor / t_base:5.2f}%")
+
+    registro = base.head(1).to_dict('records')
+    grupo = sin_monitor.score_records(registro)[0]['grupo_riesgo']
+    t_base = medir(lambda: sin_monitor.score_records(registro), 200)
+    t_monitor = medir(lambda: con_monitor.monitor.update_records(registro, [grupo]), 200)
+    print(f"{'/score 1':>10} reg.  puntuación={t_base * 1000:9.3f} ms  monitor={t_monitor * 1000:7.3f} ms  "
+          f"sobrecosto={100 * t_monitor / t_base:5.2f}%")
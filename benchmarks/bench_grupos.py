@@ -0,0 +1,53 @@
+# Micro-benchmark: asignación de grupos t1-t8 vectorizada vs. Series.apply fila a fila
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from config import MODEL_PATH
+from predict import RiskPredictor
+
+
+def asignar_grupo_legacy(prob):
+    if 0 <= prob <= 0.01:
+        return 't1'
+    elif 0.01 < prob <= 0.015:
+        return 't2'
+    elif 0.015 < prob <= 0.03:
+        return 't3'
+    elif 0.03 < prob <= 0.045:
+        return 't4'
+    elif 0.045 < prob <= 0.08:
+        return 't5'
+    elif 0.08 < prob <= 0.15:
+        return 't6'
+    elif 0.15 < prob <= 0.30:
+        return 't7'
+    elif 0.30 < prob <= 1.0:
+        return 't8'
+    else:
+        return 'fuera_rango'
+
+
+if __name__ == '__main__':
+    predictor = RiskPredictor(MODEL_PATH)
+    rng = np.random.default_rng(42)
+
+    for n in [10_000, 100_000, 1_000_000]:
+        probs = pd.Series(rng.beta(0.8, 4, size=n))
+        # Incluye los límites exactos para validar la semántica de los intervalos
+        probs.iloc[:9] = [0.0, 0.01, 0.015, 0.03, 0.045, 0.08, 0.15, 0.30, 1.0]
+
+        legacy = probs.apply(asignar_grupo_legacy)
+        vectorizado = predictor.asignar_grupos(probs.values)
+        assert (legacy.values == np.asarray(vectorizado, dtype=object)).all()
+
+        repeat = 3
+        t_legacy = min(timeit.repeat(lambda: probs.apply(asignar_grupo_legacy), number=1, repeat=repeat))
+        t_vect = min(timeit.repeat(lambda: predictor.asignar_grupos(probs.values), number=1, repeat=repeat))
+        print(f"n={n:>9,}  apply={t_legacy * 1e3:9.2f} ms  vectorizado={t_vect * 1e3:8.2f} ms  "
+              f"speedup={t_legacy / t_vect:7.1f}x")
@@ -0,0 +1,58 @@
+# Backend numpy (ensamble aplanado) vs. booster nativo de LightGBM por tamaño de lote
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import lightgbm as lgb
+
+from bench_suite import portafolio_sintetico
+from export_model import native_model
+from data_preprocesing import ModelPreprocessor
+from schema import read_raw
+from tree_inference import FlatForest
+
+
+def medir(fn, repeticiones):
+    fn()
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - t0)
+    return float(np.median(tiempos))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lotes', type=int, nargs='+', default=[1, 10, 100, 1_000, 10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')
+    booster = lgb.Booster(model_file=native_model())
+    t0 = time.perf_counter()
+    forest = FlatForest.from_booster(booster)
+    print(f"{forest.n_trees} árboles, profundidad {forest.depth}, "
+          f"{'tabla de decisiones' if forest.tables is not None else 'recorrido por niveles'}; "
+          f"aplanado en {time.perf_counter() - t0:.2f} s")
+
+    base = read_raw(os.path.join(ROOT, 'data', 'raw', 'base_validacion.csv'))
+    df = portafolio_sintetico(base, max(args.lotes), np.random.default_rng(42))
+    X, _ = ModelPreprocessor.load().transform_array(df)
+
+    for n in args.lotes:
+        x = X[:n]
+        repeticiones = max(3, min(300, 30_000 // n))
+        t_uno = medir(lambda: booster.predict(x, num_threads=1), repeticiones)
+        t_todos = medir(lambda: booster.predict(x), repeticiones)
+        t_numpy = medir(lambda: forest.predict(x), repeticiones)
+        diferencia = np.abs(booster.predict(x) - forest.predict(x)).max()
+        print(f"lote={n:>9,}  lightgbm(1 hilo)={t_uno * 1e3:10.3f} ms  lightgbm={t_todos * 1e3:10.3f} ms  "
+              f"numpy={t_numpy * 1e3:10.3f} ms  speedup={t_uno / t_numpy:5.2f}x  max|dif|={diferencia:.1e}")
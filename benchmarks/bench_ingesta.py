@@ -0,0 +1,60 @@
+# Ingesta: pd.read_csv(sep='|') con tipos inferidos vs. lector tipado (pyarrow + esquema) y Parquet
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from config import MODEL_PATH
+from predict import RiskPredictor
+from schema import iter_raw, read_raw, convert
+
+
+def medir(nombre, fn, tam_mb):
+    t0 = time.perf_counter()
+    df = fn()
+    segundos = time.perf_counter() - t0
+    memoria = df.memory_usage(deep=True).sum() / 1024 ** 2
+    print(f"{nombre:<28} {segundos:7.3f} s  {tam_mb / segundos:8.1f} MB/s  memoria={memoria:8.1f} MB")
+
+
+def verificar_stream(base: pd.DataFrame, tmp: str):
+    # Un num_doc o un conteo de buró vacío en un bloque posterior al primero no debe cambiar los
+    # tipos entre bloques: el escritor Parquet del stream fija su esquema con el primer bloque
+    df = pd.concat([base] * 20, ignore_index=True)
+    df.loc[len(df) - 1, ['num_doc', 'CO01ACP011RO']] = None
+    csv_path = os.path.join(tmp, 'num_doc_vacio.csv')
+    df.to_csv(csv_path, sep='|', index=False)
+    bloque = os.path.getsize(csv_path) // 8
+    tipos = {tuple(chunk.dtypes.astype(str)) for chunk in iter_raw(csv_path, block_size=bloque)}
+    assert len(tipos) == 1, f"Tipos distintos entre bloques: {tipos}"
+    salida = os.path.join(tmp, 'num_doc_vacio.parquet')
+    n, _ = RiskPredictor(MODEL_PATH).predict_stream(csv_path, salida, block_size=bloque)
+    resultado = pd.read_parquet(salida)
+    assert len(resultado) == n and resultado['num_doc'].isna().sum() == 1
+    assert str(next(iter_raw(csv_path))['CO01ACP011RO'].dtype) == 'Int8'
+    print(f"stream con num_doc y conteo vacíos en el último bloque: {n:,} filas, tipos estables entre bloques")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--replicas', type=int, default=100, help="Veces que se replica base_prueba.csv")
+    args = parser.parse_args()
+
+    base = pd.read_csv(os.path.join(ROOT, 'data', 'raw', 'base_prueba.csv'), sep='|', encoding='utf-8')
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'portafolio.csv')
+        pd.concat([base] * args.replicas).to_csv(csv_path, sep='|', index=False)
+        parquet_path = convert(csv_path, os.path.join(tmp, 'portafolio.parquet'))
+        tam_mb = os.path.getsize(csv_path) / 1024 ** 2
+        print(f"{len(base) * args.replicas:,} filas, {tam_mb:.1f} MB")
+
+        medir("pd.read_csv (inferido)", lambda: pd.read_csv(csv_path, sep='|', encoding='utf-8'), tam_mb)
+        medir("read_raw (pyarrow, tipado)", lambda: read_raw(csv_path), tam_mb)
+        medir("read_raw (Parquet)", lambda: read_raw(parquet_path), tam_mb)
+        verificar_stream(base, tmp)
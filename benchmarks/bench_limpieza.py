@@ -0,0 +1,70 @@
+# DataCleaner.clean vectorizado vs. la versión por columnas con pandas (quantile, pd.cut, drop_duplicates)
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from data_preparation import DataCleaner
+from schema import read_raw
+
+
+class DataCleanerLegacy(DataCleaner):
+    def clean(self, df):
+        df = df.copy()
+        df = df.drop(columns=self.DROP_COLUMNS, errors='ignore')
+        for col, (bins, labels) in self.CATEGORY_BINS.items():
+            df[col] = pd.cut(df[col], bins=bins, labels=labels)
+        numeric_cols = df.select_dtypes(include='number').drop(columns=['default'], errors='ignore').columns
+        for col in numeric_cols:
+            df[col] = df[col].clip(lower=df[col].quantile(self.lower_winsor),
+                                   upper=df[col].quantile(self.upper_winsor))
+        for col in self.UNKNOWN_CATEGORY_COLUMNS:
+            df[col] = df[col].cat.add_categories('desconocido').fillna('desconocido')
+        mode = df['CO01NUM002AH'].mode()
+        if len(mode):
+            df['CO01NUM002AH'] = df['CO01NUM002AH'].fillna(mode[0])
+        return df.drop_duplicates()
+
+
+def portafolio(base, filas, rng):
+    # Réplicas de base_prueba.csv con ruido multiplicativo; ~1% de filas repetidas
+    df = base.sample(filas, replace=True, random_state=0).reset_index(drop=True)
+    unicas = rng.random(filas) > 0.01
+    for col in df.select_dtypes('float').columns:
+        ruido = (1 + rng.normal(0, 0.05, filas)).astype(df[col].dtype)
+        df[col] = np.where(unicas, df[col].to_numpy() * ruido, df[col].to_numpy())
+    return df
+
+
+def medir(fn, df):
+    entrada = df.copy()
+    t0 = time.perf_counter()
+    resultado = fn(entrada)
+    return time.perf_counter() - t0, resultado
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--filas', type=int, nargs='+', default=[100_000, 1_000_000, 3_000_000])
+    parser.add_argument('--tipado', action='store_true', help="Lee con el esquema (float32) en lugar de pd.read_csv")
+    args = parser.parse_args()
+
+    ruta = os.path.join(ROOT, 'data', 'raw', 'base_prueba.csv')
+    base = read_raw(ruta) if args.tipado else pd.read_csv(ruta, sep='|', encoding='utf-8')
+    rng = np.random.default_rng(42)
+    for filas in args.filas:
+        df = portafolio(base, filas, rng)
+
+        t_legacy, legacy = medir(DataCleanerLegacy().clean, df)
+        t_copia, copia = medir(lambda d: DataCleaner().clean(d, copy=True), df)
+        t_sin_copia, sin_copia = medir(lambda d: DataCleaner().clean(d, copy=False), df)
+
+        iguales = legacy.equals(copia) and legacy.equals(sin_copia)
+        print(f"{filas:>10,} filas  pandas={t_legacy:7.2f} s  vectorizado={t_copia:6.2f} s  "
+              f"sin_copia={t_sin_copia:6.2f} s  speedup={t_legacy / t_sin_copia:5.1f}x  iguales={iguales}")
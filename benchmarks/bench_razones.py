@@ -0,0 +1,59 @@
+# Costo de los códigos de razón: contribuciones TreeSHAP tabuladas por patrón (tree_inference)
+# vs. pred_contrib nativo de LightGBM, y sobrecarga de predict_from_dataframe con razones
+import argparse
+import logging
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_inference import medir
+from bench_suite import portafolio_sintetico
+from export_model import native_model
+from predict import RiskPredictor
+from schema import read_raw
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lotes', type=int, nargs='+', default=[1, 100, 10_000])
+    parser.add_argument('--filas', type=int, default=100_000, help="Lote de predict_from_dataframe")
+    parser.add_argument('--k', type=int, default=3)
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')
+    logging.disable(logging.WARNING)
+    predictor = RiskPredictor(native_model())
+    predictor.n_threads = 1
+    base = read_raw(os.path.join(ROOT, 'data', 'raw', 'base_validacion.csv'))
+    df = portafolio_sintetico(base, max(max(args.lotes), args.filas), np.random.default_rng(42))
+    X, _ = predictor.preprocessor.transform_array(df)
+
+    t0 = time.perf_counter()
+    predictor.contribuciones(X[:1])
+    print(f"tablas de contribuciones: {time.perf_counter() - t0:.2f} s (una vez por modelo)")
+    booster = predictor.model
+    for n in args.lotes:
+        x = X[:n]
+        repeticiones = max(3, min(100, 3_000 // n))
+        t_pred = medir(lambda: booster.predict(x, num_threads=1), repeticiones)
+        t_nativo = medir(lambda: booster.predict(x, pred_contrib=True, num_threads=1), max(3, repeticiones // 10))
+        t_tabla = medir(lambda: predictor.razones(x, args.k), repeticiones)
+        diferencia = np.abs(predictor.contribuciones(x) - booster.predict(x, pred_contrib=True)).max()
+        print(f"lote={n:>7,}  predict={t_pred / n * 1e6:8.1f} µs/fila  pred_contrib={t_nativo / n * 1e6:8.1f} µs/fila  "
+              f"razones(tabla, top-{args.k})={t_tabla / n * 1e6:8.1f} µs/fila  "
+              f"speedup={t_nativo / t_tabla:5.1f}x  max|dif|={diferencia:.1e}")
+
+    lote = df.iloc[:args.filas]
+    t_sin = medir(lambda: predictor.predict_from_dataframe(lote), 3)
+    t_con = medir(lambda: predictor.predict_from_dataframe(lote, args.k), 3)
+    t_grupos = medir(lambda: predictor.predict_from_dataframe(lote, args.k, ['t6', 't7', 't8']), 3)
+    explicadas = predictor.predict_from_dataframe(lote)['grupo_riesgo'].isin(['t6', 't7', 't8']).mean()
+    print(f"predict_from_dataframe ({args.filas:,} filas, 1 hilo): sin razones {t_sin:.2f} s  "
+          f"top-{args.k} todas {t_con:.2f} s ({t_con / t_sin:.1f}x)  "
+          f"solo t6-t8 ({explicadas:.0%} de las filas) {t_grupos:.2f} s ({t_grupos / t_sin:.1f}x)")
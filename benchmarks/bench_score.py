@@ -0,0 +1,48 @@
+# Latencia de /score (JSON, preprocesamiento NumPy) vs. /predict/ (archivo de una fila)
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.join(ROOT, 'api'))
+
+from fastapi.testclient import TestClient
+
+import app
+
+
+def percentiles(fn, n=300, warmup=20):
+    for _ in range(warmup):
+        fn()
+    tiempos = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - t0)
+    tiempos = np.array(tiempos) * 1e3
+    return np.percentile(tiempos, 50), np.percentile(tiempos, 99)
+
+
+if __name__ == '__main__':
+    client = TestClient(app.app)
+    predictor = app.get_predictor()
+    df = pd.read_csv(os.path.join(ROOT, 'data', 'raw', 'base_prueba.csv'), sep='|', encoding='utf-8')
+    fila = df.head(1)
+    registro = fila.to_dict('records')[0]
+    archivo = fila.to_csv(sep='|', index=False).encode('utf-8')
+
+    casos = {
+        'RiskPredictor.score_records (en proceso)': lambda: predictor.score_records([registro]),
+        'RiskPredictor.predict_from_dataframe (en proceso)': lambda: predictor.predict_from_dataframe(fila),
+        'POST /score (1 registro)': lambda: client.post('/score', json=registro),
+        'POST /predict/ (archivo de 1 fila)': lambda: client.post(
+            '/predict/', files={'file': ('fila.csv', io.BytesIO(archivo))}),
+    }
+    for nombre, fn in casos.items():
+        p50, p99 = percentiles(fn)
+        print(f"{nombre:<52} p50={p50:7.2f} ms  p99={p99:7.2f} ms")
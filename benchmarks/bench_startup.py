@@ -0,0 +1,47 @@
+# Tiempo de arranque en frío del servicio: importar api/app.py y quedar listo para puntuar
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from config import MODEL_PATH
+from export_model import native_model
+
+SCRIPT = '''
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {api!r})
+import app
+t1 = time.perf_counter()
+app.get_predictor()
+t2 = time.perf_counter()
+print(json.dumps({{'import_s': t1 - t0, 'listo_s': t2 - t0,
+                  'statsmodels': 'statsmodels' in sys.modules,
+                  'feature_selection': 'feature_selection' in sys.modules}}))
+'''
+
+
+def medir(model_path, repeticiones=5):
+    env = dict(os.environ, MODEL_PATH=model_path)
+    codigo = SCRIPT.format(api=os.path.join(ROOT, 'api'))
+    resultados = []
+    for _ in range(repeticiones):
+        salida = subprocess.run([sys.executable, '-c', codigo], env=env, capture_output=True, text=True, check=True)
+        resultados.append(json.loads(salida.stdout.strip().splitlines()[-1]))
+    return {
+        'import_s': statistics.median(r['import_s'] for r in resultados),
+        'listo_s': statistics.median(r['listo_s'] for r in resultados),
+        'statsmodels': resultados[0]['statsmodels'],
+        'feature_selection': resultados[0]['feature_selection'],
+    }
+
+
+if __name__ == '__main__':
+    for model_path in [MODEL_PATH, native_model()]:
+        r = medir(model_path)
+        print(f"{os.path.basename(model_path):<10} import={r['import_s']:.3f} s  listo={r['listo_s']:.3f} s  "
+              f"statsmodels={r['statsmodels']}  feature_selection={r['feature_selection']}")
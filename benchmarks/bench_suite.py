@@ -0,0 +1,342 @@
+# Suite reproducible de rendimiento: limpieza, preprocesamiento, selección de variables,
+# puntuación en memoria, puntuación de archivos de punta a punta y latencia de la API.
+# Los resultados se guardan en JSON y se comparan contra una línea base versionada.
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+from batch import score_parallel
+from config import PREPROCESSOR_PATH
+from data_preparation import DataCleaner
+from data_preprocesing import ModelPreprocessor
+from export_model import native_model
+from feature_selection import FeatureSelector
+from predict import RiskPredictor
+from schema import load_schema, read_raw
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BENCH_DIR, '.data')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+SEMILLA = 42
+BLOQUE_ESCRITURA = 1_000_000
+
+
+def portafolio_sintetico(base: pd.DataFrame, n: int, rng) -> pd.DataFrame:
+    # Remuestreo de filas reales (conserva la correlación entre variables y la tasa de default)
+    # con identificadores nuevos y un ruido relativo del 1% en los valores positivos, de modo
+    # que las filas no se repitan y la limpieza no las descarte como duplicadas.
+    df = base.iloc[rng.integers(0, len(base), n)].reset_index(drop=True)
+    df['num_doc'] = np.arange(1_000_000_000, 1_000_000_000 + n, dtype=np.int64)
+    for col in df.columns:
+        if col in ('num_doc', 'f_analisis', 'default') or not pd.api.types.is_float_dtype(df[col]):
+            continue
+        values = df[col].to_numpy()
+        ruido = rng.normal(1.0, 0.01, n).astype(values.dtype)
+        df[col] = np.where(values > 0, values * ruido, values)
+    return df
+
+
+def escribir_portafolio(base: pd.DataFrame, n: int, columnas) -> str:
+    # Archivo con el esquema de base_prueba.csv ('|', sin variable respuesta), generado por
+    # bloques para acotar la memoria y reutilizado entre ejecuciones con la misma semilla y
+    # esquema (el ruido solo se aplica a las columnas float del esquema)
+    import hashlib
+
+    import pyarrow as pa
+    import pyarrow.csv as pv
+
+    esquema = hashlib.md5(json.dumps(load_schema(), sort_keys=True).encode()).hexdigest()[:8]
+    path = os.path.join(DATA_DIR, f'portafolio_{n}_{SEMILLA}_{esquema}.csv')
+    if os.path.exists(path):
+        return path
+    os.makedirs(DATA_DIR, exist_ok=True)
+    rng = np.random.default_rng(SEMILLA)
+    tmp = path + '.tmp'
+    writer = None
+    try:
+        for inicio in range(0, n, BLOQUE_ESCRITURA):
+            df = portafolio_sintetico(base, min(BLOQUE_ESCRITURA, n - inicio), rng)
+            df['num_doc'] += inicio
+            table = pa.Table.from_pandas(df[columnas], preserve_index=False)
+            if writer is None:
+                opciones = pv.WriteOptions(delimiter='|', quoting_style='none', quoting_header='none')
+                writer = pv.CSVWriter(tmp, table.schema, write_options=opciones)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp, path)
+    return path
+
+
+def medir(fn, repeticiones, preparar=None):
+    # Mediana y mínimo de varias repeticiones; preparar() corre fuera del tiempo medido
+    tiempos = []
+    for _ in range(repeticiones):
+        argumento = preparar() if preparar else None
+        t0 = time.perf_counter()
+        fn(argumento) if preparar else fn()
+        tiempos.append(time.perf_counter() - t0)
+    return float(np.median(tiempos)), float(np.min(tiempos))
+
+
+def registro(caso, filas, mediana, minimo, **extra):
+    return {
+        'caso': caso,
+        'filas': filas,
+        'mediana_s': round(mediana, 6),
+        'min_s': round(minimo, 6),
+        'filas_por_segundo': round(filas / mediana, 1) if mediana else None,
+        **extra,
+    }
+
+
+def etapas_en_memoria(df, predictor, repeticiones, max_seleccion):
+    resultados = []
+    n = len(df)
+    preprocessor = predictor.preprocessor
+
+    mediana, minimo = medir(lambda d: DataCleaner().clean(d, copy=False), repeticiones, preparar=df.copy)
+    resultados.append(registro('limpieza', n, mediana, minimo))
+
+    mediana, minimo = medir(lambda: preprocessor.transform(df), repeticiones)
+    resultados.append(registro('preprocesamiento', n, mediana, minimo))
+
+    # Selección sobre la matriz completa del ColumnTransformer, como en el entrenamiento
+    muestra = df.iloc[:max_seleccion]
+    limpio = preprocessor.cleaner.transform(muestra, copy=True)
+    X = pd.DataFrame(preprocessor.preprocessor.transform(limpio[preprocessor.num_cols + preprocessor.cat_cols]),
+                     columns=preprocessor.feature_names_out)
+    y = muestra['default'].to_numpy()
+    with contextlib.redirect_stdout(io.StringIO()):
+        mediana, minimo = medir(lambda: FeatureSelector().select(X, y), repeticiones)
+    resultados.append(registro('seleccion', len(X), mediana, minimo))
+
+    mediana, minimo = medir(lambda: predictor.predict_from_dataframe(df), repeticiones)
+    resultados.append(registro('prediccion', n, mediana, minimo))
+    return resultados
+
+
+def punta_a_punta(path, n, predictor, repeticiones, workers):
+    resultados = []
+    with tempfile.TemporaryDirectory() as tmp:
+        salida = os.path.join(tmp, 'salida.parquet')
+        mediana, minimo = medir(lambda: read_raw(path), repeticiones)
+        resultados.append(registro('lectura', n, mediana, minimo))
+
+        mediana, minimo = medir(lambda: predictor.predict_stream(path, salida), repeticiones)
+        resultados.append(registro('archivo_stream', n, mediana, minimo))
+
+        mediana, minimo = medir(lambda: score_parallel(path, salida, n_workers=workers), repeticiones)
+        resultados.append(registro('archivo_paralelo', n, mediana, minimo, workers=workers))
+    return resultados
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def servidor_api(timeout=60):
+    # uvicorn en un proceso aparte, como en producción; se espera a que responda /openapi.json
+    import requests
+
+    puerto = _puerto_libre()
+    proceso = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'app:app', '--app-dir', os.path.join(ROOT, 'api'),
+         '--host', '127.0.0.1', '--port', str(puerto), '--log-level', 'warning'],
+        env={**os.environ, 'DRIFT_MONITOR': '0', 'PREDICTION_CACHE_SIZE': '0'},
+    )
+    url = f'http://127.0.0.1:{puerto}'
+    try:
+        limite = time.monotonic() + timeout
+        while True:
+            try:
+                if requests.get(f'{url}/openapi.json', timeout=1).ok:
+                    break
+            except requests.ConnectionError:
+                pass
+            if proceso.poll() is not None or time.monotonic() > limite:
+                raise RuntimeError("El servidor uvicorn no arrancó")
+            time.sleep(0.2)
+        yield url
+    finally:
+        proceso.terminate()
+        proceso.wait()
+
+
+def latencias_api(url, registros, archivos, solicitudes):
+    import requests
+
+    resultados = []
+    with requests.Session() as session:
+        for lote in (1, 100):
+            cuerpo = registros[:lote]
+            for _ in range(20):
+                session.post(f'{url}/score', json=cuerpo).raise_for_status()
+            tiempos = []
+            for _ in range(solicitudes):
+                t0 = time.perf_counter()
+                session.post(f'{url}/score', json=cuerpo).raise_for_status()
+                tiempos.append(time.perf_counter() - t0)
+            tiempos = np.array(tiempos)
+            resultados.append(registro(
+                f'api_score_{lote}', lote, float(np.median(tiempos)), float(tiempos.min()),
+                p95_ms=round(float(np.percentile(tiempos, 95)) * 1e3, 3),
+                p99_ms=round(float(np.percentile(tiempos, 99)) * 1e3, 3),
+            ))
+
+        for n, path in archivos:
+            def subir():
+                with open(path, 'rb') as f:
+                    r = session.post(f'{url}/predict/?formato=arrow', files={'file': ('portafolio.csv', f)})
+                r.raise_for_status()
+            mediana, minimo = medir(subir, 3)
+            resultados.append(registro('api_predict_archivo', n, mediana, minimo))
+    return resultados
+
+
+def entorno() -> dict:
+    import lightgbm
+    import sklearn
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+        'lightgbm': lightgbm.__version__,
+    }
+
+
+def comparar(resultados, baseline, tolerancia):
+    # Cociente actual / línea base sobre la mediana; > 1 + tolerancia es una regresión
+    previos = {(r['caso'], r['filas']): r for r in baseline['resultados']}
+    comparacion = []
+    for r in resultados:
+        previo = previos.get((r['caso'], r['filas']))
+        if previo is None or not previo['mediana_s']:
+            continue
+        cociente = r['mediana_s'] / previo['mediana_s']
+        estado = 'regresion' if cociente > 1 + tolerancia else 'mejora' if cociente < 1 - tolerancia else 'igual'
+        comparacion.append({
+            'caso': r['caso'], 'filas': r['filas'], 'base_s': previo['mediana_s'],
+            'actual_s': r['mediana_s'], 'cociente': round(cociente, 3), 'estado': estado,
+        })
+    return comparacion
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Suite de rendimiento del pipeline de puntuación")
+    parser.add_argument('--filas', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                        help="Tamaños de portafolio (p. ej. 10000 100000 1000000 10000000)")
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--max-en-memoria', type=int, default=1_000_000,
+                        help="Por encima de este tamaño solo se miden las rutas por archivo")
+    parser.add_argument('--max-seleccion', type=int, default=200_000,
+                        help="Filas usadas en la selección de variables")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--sin-api', action='store_true')
+    parser.add_argument('--max-filas-api', type=int, default=100_000)
+    parser.add_argument('--solicitudes', type=int, default=300)
+    parser.add_argument('--output', default=None, help="JSON de resultados (por defecto benchmarks/results/)")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--guardar-baseline', action='store_true', help="Reemplaza la línea base con esta corrida")
+    parser.add_argument('--tolerancia', type=float, default=0.2)
+    parser.add_argument('--estricto', action='store_true', help="Código de salida 1 si hay regresiones")
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')
+    base = read_raw(os.path.join(ROOT, 'data', 'raw', 'base_validacion.csv'))
+    columnas = pd.read_csv(os.path.join(ROOT, 'data', 'raw', 'base_prueba.csv'), sep='|', nrows=0).columns.tolist()
+    predictor = RiskPredictor(native_model(), preprocessor=ModelPreprocessor.load(PREPROCESSOR_PATH))
+    workers = args.workers or os.cpu_count()
+
+    resultados, archivos = [], []
+    for n in args.filas:
+        t0 = time.perf_counter()
+        path = escribir_portafolio(base, n, columnas)
+        print(f"{n:>12,} filas  archivo listo en {time.perf_counter() - t0:6.1f} s")
+        if n <= args.max_filas_api:
+            archivos.append((n, path))
+
+        casos = []
+        if n <= args.max_en_memoria:
+            df = portafolio_sintetico(base, n, np.random.default_rng(SEMILLA))
+            casos += etapas_en_memoria(df, predictor, args.repeticiones, args.max_seleccion)
+            del df
+        casos += punta_a_punta(path, n, predictor, args.repeticiones, workers)
+        for r in casos:
+            print(f"{r['filas']:>12,} filas  {r['caso']:<20} mediana={r['mediana_s']:9.3f} s  "
+                  f"{r['filas_por_segundo'] or 0:>14,.0f} filas/s")
+        resultados += casos
+
+    if not args.sin_api:
+        registros = base.drop(columns=['default']).head(100)
+        registros = json.loads(registros.to_json(orient='records'))
+        with servidor_api() as url:
+            casos = latencias_api(url, registros, archivos, args.solicitudes)
+        for r in casos:
+            extra = f"  p99={r['p99_ms']:7.2f} ms" if 'p99_ms' in r else ''
+            print(f"{r['filas']:>12,} filas  {r['caso']:<20} mediana={r['mediana_s'] * 1e3:9.2f} ms{extra}")
+        resultados += casos
+
+    salida = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'entorno': entorno(),
+        'parametros': {'repeticiones': args.repeticiones, 'semilla': SEMILLA, 'workers': workers},
+        'resultados': resultados,
+    }
+    regresiones = []
+    if os.path.exists(args.baseline) and not args.guardar_baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        salida['baseline'] = {'fecha': baseline['fecha'], 'commit': baseline['entorno'].get('commit')}
+        salida['comparacion'] = comparar(resultados, baseline, args.tolerancia)
+        print(f"\nComparación con la línea base ({baseline['entorno'].get('commit')}, {baseline['fecha']}):")
+        for c in salida['comparacion']:
+            print(f"{c['filas']:>12,} filas  {c['caso']:<20} {c['base_s']:9.3f} s -> {c['actual_s']:9.3f} s  "
+                  f"x{c['cociente']:5.2f}  {c['estado']}")
+        regresiones = [c for c in salida['comparacion'] if c['estado'] == 'regresion']
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"bench_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(salida, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados en {output}")
+    if args.guardar_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(salida, f, indent=2, ensure_ascii=False)
+        print(f"Línea base actualizada: {args.baseline}")
+
+    if regresiones and args.estricto:
+        sys.exit(1)
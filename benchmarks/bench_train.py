@@ -0,0 +1,43 @@
+# Halving sucesivo (src/train.py) vs. GridSearchCV exhaustivo del notebook 004_model_selection
+import argparse
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from sklearn.model_selection import GridSearchCV
+
+from train import HalvingStudy, model_spaces, prepare_matrices
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('train_path')
+    parser.add_argument('--modelos', nargs='+', default=['LightGBM_HPO'])
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')
+    matrices = prepare_matrices(args.train_path)
+    X, y = matrices['X_train'], matrices['y_train']
+    spaces = model_spaces((y == 0).sum() / (y == 1).sum())
+
+    for model_name in args.modelos:
+        estimator, param_grid = spaces[model_name]
+
+        t0 = time.perf_counter()
+        grid = GridSearchCV(estimator, param_grid, scoring='f1', cv=3, n_jobs=args.n_jobs).fit(X, y)
+        t_grid = time.perf_counter() - t0
+
+        with tempfile.TemporaryDirectory() as studies_dir:
+            t0 = time.perf_counter()
+            best, history = HalvingStudy('bench', studies_dir=studies_dir, n_jobs=args.n_jobs).run(
+                model_name, estimator, param_grid, X, y)
+            t_halving = time.perf_counter() - t0
+
+        print(f"{model_name}: grid={t_grid:7.1f} s (f1={grid.best_score_:.4f})  "
+              f"halving={t_halving:7.1f} s (f1={best['score']:.4f}, {len(history)} evaluaciones)  "
+              f"speedup={t_grid / t_halving:5.1f}x")
@@ -0,0 +1,264 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+import joblib
+from joblib import Parallel, delayed
+
+from config import BASE_DIR
+from predict import FUERA_RANGO
+from schema import read_raw
+
+CACHE_DIR = os.path.join(BASE_DIR, 'models', 'cache')
+PERIODO = 'f_analisis'
+# Celdas (réplicas x filas) por bloque de bootstrap: acota la memoria de los conteos
+BOOTSTRAP_ELEMENTS = 1 << 21
+
+
+def _auc_ks(positivos, negativos) -> tuple:
+    # Conteos enteros (réplicas, niveles de puntaje) en orden ascendente de puntaje. El AUC cuenta
+    # los pares (positivo, negativo) con el positivo por encima más la mitad de los empatados; el
+    # KS es la máxima distancia entre las acumuladas. Ambos con aritmética entera exacta.
+    neg_acumulados = np.cumsum(negativos, axis=1, dtype=np.int64)
+    pos_acumulados = np.cumsum(positivos, axis=1, dtype=np.int64)
+    total_pos, total_neg = pos_acumulados[:, -1], neg_acumulados[:, -1]
+    pares = np.multiply(positivos, 2 * neg_acumulados - negativos, dtype=np.int64).sum(axis=1)
+    distancia = np.abs(pos_acumulados * total_neg[:, None] - neg_acumulados * total_pos[:, None]).max(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        denominador = total_pos.astype(float) * total_neg
+        return pares / (2 * denominador), distancia / denominador
+
+
+def curvas(score, y, replicas=0, rng=None) -> tuple:
+    # AUC y KS del puntaje; con replicas > 0, los de cada réplica de bootstrap, vectorizados por
+    # bloques de réplicas. Las filas se ordenan una sola vez y se agrupan por valor de puntaje.
+    orden = np.argsort(score, kind='stable')
+    score_ordenado = score[orden]
+    y_ordenado = np.asarray(y, dtype=np.int32)[orden]
+    empates = bool((score_ordenado[1:] == score_ordenado[:-1]).any())
+    inicios = np.r_[0, np.flatnonzero(np.diff(score_ordenado)) + 1] if empates else None
+
+    def conteos(pesos):
+        positivos = pesos * y_ordenado
+        negativos = pesos - positivos
+        if empates:
+            positivos = np.add.reduceat(positivos, inicios, axis=1)
+            negativos = np.add.reduceat(negativos, inicios, axis=1)
+        return _auc_ks(positivos, negativos)
+
+    if not replicas:
+        return conteos(np.ones((1, len(score)), dtype=np.int32))
+    # Las filas son intercambiables: los conteos de remuestreo se asignan directamente en el
+    # orden del puntaje, sin reordenar una matriz (réplicas, filas)
+    bloque = max(1, BOOTSTRAP_ELEMENTS // len(score))
+    partes = [conteos(bootstrap_pesos(len(score), min(bloque, replicas - i), rng))
+              for i in range(0, replicas, bloque)]
+    return tuple(np.concatenate(metrica) for metrica in zip(*partes))
+
+
+def bootstrap_pesos(n, replicas, rng) -> np.ndarray:
+    # Conteos (réplicas, n) de un remuestreo con reemplazo, sin materializar las filas remuestreadas
+    indices = rng.integers(0, n, (replicas, n), dtype=np.int32)
+    indices += (np.arange(replicas, dtype=np.int32) * n)[:, None]
+    return np.bincount(indices.ravel(), minlength=replicas * n).reshape(replicas, n).astype(np.int32)
+
+
+def calibracion(probs, y, codes, buckets) -> pd.DataFrame:
+    # Por grupo de riesgo: PD media frente a la tasa de default observada, si esa tasa cae dentro
+    # de los límites del grupo y el estadístico z binomial (defaults observados vs. esperados)
+    grupos = buckets['grupo'].tolist() + [FUERA_RANGO]
+    k = len(grupos)
+    y = np.asarray(y, dtype=float)
+    n = np.bincount(codes, minlength=k)
+    suma_pd = np.bincount(codes, weights=probs, minlength=k)
+    defaults = np.bincount(codes, weights=y, minlength=k)
+    varianza = np.bincount(codes, weights=probs * (1.0 - probs), minlength=k)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tasa = defaults / n
+        z = (defaults - suma_pd) / np.sqrt(varianza)
+    df = pd.DataFrame({
+        'grupo': grupos,
+        'n': n,
+        'participacion': n / max(n.sum(), 1),
+        'pd_media': suma_pd / np.maximum(n, 1),
+        'defaults': defaults.astype(np.int64),
+        'tasa_default': tasa,
+        'limite_inferior': np.r_[buckets['limite_inferior'].to_numpy(), np.nan],
+        'limite_superior': np.r_[buckets['limite_superior'].to_numpy(), np.nan],
+        'z_binomial': z,
+    })
+    df['tasa_en_rango'] = (tasa >= df['limite_inferior']) & (tasa <= df['limite_superior'])
+    return df[df['n'] > 0].reset_index(drop=True)
+
+
+class BacktestEngine:
+    # Backtesting fuera de tiempo por periodo de f_analisis. Los datos se limpian y transforman
+    # una sola vez, se ordenan por periodo (cada periodo queda como una vista contigua de la
+    # matriz) y se guardan en models/cache por archivo y estado del preprocesamiento. Cada
+    # corrida solo puntúa (periodos en paralelo) y calcula las métricas vectorizadas.
+    # descartar_sin_respuesta: las filas sin 'default' (cohortes recientes sin madurar) se
+    # descartan con un aviso por periodo en lugar de rechazar el archivo
+    def __init__(self, predictor, periodo=PERIODO, n_jobs=None, cache_dir=CACHE_DIR,
+                 descartar_sin_respuesta=False):
+        self.predictor = predictor
+        self.periodo = periodo
+        self.descartar_sin_respuesta = descartar_sin_respuesta
+        self.n_jobs = n_jobs or os.cpu_count()
+        self.cache_dir = cache_dir
+        self.periodos = []
+        self.X = None
+        self.y = None
+        self._limites = {}
+        self._scores = None
+
+    def _cache_key(self, paths) -> str:
+        firmas = []
+        for path in paths:
+            stat = os.stat(path)
+            firmas.append(f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}")
+        # Las matrices dependen también de la columna de periodo y de la variable respuesta
+        firmas.append(f"{self.periodo}|{self.predictor.preprocessor.target_column}|{self.descartar_sin_respuesta}")
+        firmas.append(joblib.hash(self.predictor.preprocessor.get_state()))
+        return hashlib.md5('|'.join(firmas).encode()).hexdigest()[:16]
+
+    def cargar(self, paths) -> 'BacktestEngine':
+        paths = [paths] if isinstance(paths, (str, os.PathLike)) else list(paths)
+        cache_path = None
+        if self.cache_dir:
+            cache_path = os.path.join(self.cache_dir, f"backtest_{self._cache_key(paths)}.joblib")
+            if os.path.exists(cache_path):
+                return self._set_matrices(**joblib.load(cache_path))
+
+        df = pd.concat([read_raw(path) for path in paths], ignore_index=True)
+        matrices = self._particionar(df)
+        if cache_path is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            joblib.dump(matrices, cache_path)
+        return self._set_matrices(**matrices)
+
+    def cargar_dataframe(self, df: pd.DataFrame) -> 'BacktestEngine':
+        return self._set_matrices(**self._particionar(df))
+
+    def _particionar(self, df: pd.DataFrame) -> dict:
+        preprocessor = self.predictor.preprocessor
+        if preprocessor.target_column not in df.columns:
+            raise ValueError(f"El backtesting requiere la variable respuesta '{preprocessor.target_column}'")
+        faltantes = df[preprocessor.target_column].isna()
+        if faltantes.any():
+            conteo = df.loc[faltantes, self.periodo].value_counts().sort_index()
+            detalle = ', '.join(f"{periodo}: {n:,}" for periodo, n in conteo.items())
+            if not self.descartar_sin_respuesta:
+                raise ValueError(
+                    f"{int(faltantes.sum()):,} filas sin '{preprocessor.target_column}' por periodo ({detalle}); "
+                    "use descartar_sin_respuesta=True para excluirlas")
+            print(f"⚠️ Se descartan {int(faltantes.sum()):,} filas sin '{preprocessor.target_column}' ({detalle})")
+            df = df.loc[~faltantes]
+        # La limpieza puede descartar filas: el periodo se toma de las filas que sobreviven
+        X, y = preprocessor.transform_array(df)
+        periodos = df.loc[y.index, self.periodo].to_numpy()
+        orden = np.argsort(periodos, kind='stable')
+        valores, inicios = np.unique(periodos[orden], return_index=True)
+        return {
+            'X': np.ascontiguousarray(X[orden]),
+            'y': y.to_numpy(dtype=np.int8)[orden],
+            'periodos': valores.tolist(),
+            'limites': np.r_[inicios, len(orden)],
+        }
+
+    def _set_matrices(self, X, y, periodos, limites) -> 'BacktestEngine':
+        self.X, self.y, self.periodos = X, y, periodos
+        self._limites = {p: (limites[i], limites[i + 1]) for i, p in enumerate(periodos)}
+        self._scores = None
+        return self
+
+    def _puntuar(self, periodo) -> np.ndarray:
+        inicio, fin = self._limites[periodo]
+        return self.predictor._predict_model(self.X[inicio:fin], num_threads=1)
+
+    def puntuar(self) -> np.ndarray:
+        # Un periodo por tarea con un hilo cada una: LightGBM libera el GIL al predecir
+        if self._scores is None:
+            partes = Parallel(n_jobs=self.n_jobs, prefer='threads')(
+                delayed(self._puntuar)(periodo) for periodo in self.periodos)
+            self._scores = np.concatenate(partes) if partes else np.empty(0)
+        return self._scores
+
+    def _evaluar(self, etiqueta, inicio, fin, n_bootstrap, semilla, nivel) -> tuple:
+        probs = self._scores[inicio:fin]
+        y = self.y[inicio:fin]
+        codes = np.asarray(self.predictor.asignar_grupos(probs).codes)
+        auc, ks = curvas(probs, y)
+        fila = {
+            'periodo': etiqueta,
+            'n': fin - inicio,
+            'defaults': int(y.sum()),
+            'tasa_default': float(y.mean()),
+            'pd_media': float(probs.mean()),
+            'auc': float(auc[0]),
+            'gini': float(2 * auc[0] - 1),
+            'ks': float(ks[0]),
+            'poblacion_en_rango': float((codes < len(self.predictor.buckets)).mean()),
+        }
+        if n_bootstrap:
+            aucs, kss = curvas(probs, y, n_bootstrap, np.random.default_rng(semilla))
+            cola = 100 * (1 - nivel) / 2
+            for nombre, valores in (('auc', aucs), ('gini', 2 * aucs - 1), ('ks', kss)):
+                bajo, alto = np.nanpercentile(valores, [cola, 100 - cola])
+                fila[f'{nombre}_ic_inf'], fila[f'{nombre}_ic_sup'] = float(bajo), float(alto)
+        calib = calibracion(probs, y, codes, self.predictor.buckets)
+        calib.insert(0, 'periodo', etiqueta)
+        return fila, calib
+
+    def run(self, n_bootstrap=0, semilla=42, nivel=0.95) -> tuple:
+        # (métricas por periodo + fila 'total', calibración por periodo y grupo de riesgo)
+        if self.X is None:
+            raise RuntimeError("Sin datos: llame a cargar() o cargar_dataframe() antes de run()")
+        self.puntuar()
+        tareas = [(p, *self._limites[p]) for p in self.periodos] + [('total', 0, len(self.y))]
+        resultados = Parallel(n_jobs=self.n_jobs, prefer='threads')(
+            delayed(self._evaluar)(etiqueta, inicio, fin, n_bootstrap, semilla, nivel)
+            for etiqueta, inicio, fin in tareas)
+        metricas = pd.DataFrame([fila for fila, _ in resultados])
+        calib = pd.concat([c for _, c in resultados], ignore_index=True)
+        return metricas, calib
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    from config import MODEL_PATH
+    from predict import BACKENDS, RiskPredictor
+
+    parser = argparse.ArgumentParser(description="Backtesting fuera de tiempo por periodo de f_analisis")
+    parser.add_argument('input_paths', nargs='+', help="Archivos '|' con la variable respuesta 'default'")
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--backend', choices=BACKENDS, default='lightgbm')
+    parser.add_argument('--bootstrap', type=int, default=0, help="Réplicas para intervalos de confianza")
+    parser.add_argument('--nivel', type=float, default=0.95)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--n-jobs', type=int, default=None)
+    parser.add_argument('--sin-cache', action='store_true', help="No lee ni guarda las matrices transformadas")
+    parser.add_argument('--descartar-sin-respuesta', action='store_true',
+                        help="Excluye las filas sin 'default' en lugar de rechazar los archivos")
+    parser.add_argument('--output', default=None, help="Prefijo de salida: <output>_metricas.csv y <output>_calibracion.csv")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    engine = BacktestEngine(RiskPredictor(args.model, backend=args.backend), n_jobs=args.n_jobs,
+                            cache_dir=None if args.sin_cache else CACHE_DIR,
+                            descartar_sin_respuesta=args.descartar_sin_respuesta)
+    engine.cargar(args.input_paths)
+    t_carga = time.perf_counter() - t0
+    metricas, calib = engine.run(n_bootstrap=args.bootstrap, semilla=args.semilla, nivel=args.nivel)
+    t_total = time.perf_counter() - t0
+
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(metricas.to_string(index=False, float_format='{:.4f}'.format))
+        print()
+        print(calib[calib['periodo'] == 'total'].to_string(index=False, float_format='{:.4f}'.format))
+    if args.output:
+        metricas.to_csv(f"{args.output}_metricas.csv", index=False)
+        calib.to_csv(f"{args.output}_calibracion.csv", index=False)
+    print(f"\n{len(engine.periodos)} periodos, {len(engine.y):,} filas: carga {t_carga:.2f} s, total {t_total:.2f} s")
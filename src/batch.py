@@ -0,0 +1,137 @@
+import io
+import logging
+import os
+import multiprocessing as mp
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from threadpoolctl import threadpool_limits
+
+from config import MODEL_PATH, PREPROCESSOR_PATH
+from metrics import StageTimer, stage
+from predict import BACKENDS, RiskPredictor, ResultSink, contar_fuera_rango
+from schema import read_raw
+
+# Predictor por proceso: se carga una sola vez en el inicializador del worker
+_predictor = None
+_profile_dir = None
+_razones = (0, None)
+
+
+def _init_worker(model_path, preprocessor_path, threads, profile_dir=None, backend='lightgbm', razones=0,
+                 grupos_razones=None):
+    global _predictor, _profile_dir, _razones
+    # Limita BLAS/OpenMP para que workers x hilos no supere los núcleos disponibles
+    threadpool_limits(limits=threads)
+    _predictor = RiskPredictor(model_path, preprocessor_path=preprocessor_path, backend=backend)
+    _predictor.n_threads = threads
+    _profile_dir = profile_dir
+    _razones = (razones, grupos_razones)
+
+
+def _score_partition(input_path, start, end, columns):
+    if _profile_dir is None:
+        return _run_partition(input_path, start, end, columns)
+
+    import cProfile
+
+    profiler = cProfile.Profile()
+    result = profiler.runcall(_run_partition, input_path, start, end, columns)
+    profiler.dump_stats(os.path.join(_profile_dir, f"particion_{start}.prof"))
+    return result
+
+
+def _run_partition(input_path, start, end, columns):
+    # Tiempos por etapa del worker: se devuelven para consolidarlos en el proceso principal
+    timer = StageTimer('batch')
+    with timer.activo():
+        with stage('lectura'):
+            with open(input_path, 'rb') as f:
+                f.seek(start)
+                data = f.read(end - start)
+            chunk = read_raw(io.BytesIO(data), columns=columns)
+        df_result = _predictor.predict_from_dataframe(chunk, *_razones)
+    return df_result, contar_fuera_rango(df_result), dict(timer.etapas)
+
+
+def split_partitions(input_path, partition_bytes):
+    # Rangos de bytes alineados a fin de línea; cada worker parsea su propio rango
+    size = os.path.getsize(input_path)
+    with open(input_path, 'rb') as f:
+        header = f.readline()
+        columns = header.decode('utf-8').strip().split('|')
+        partitions = []
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + partition_bytes, size))
+            if f.tell() < size:
+                f.readline()
+            end = f.tell()
+            partitions.append((start, end))
+            start = end
+    return columns, partitions
+
+
+def score_parallel(input_path, output_path, n_workers=None, partition_bytes=32 * 1024 ** 2,
+                   model_path=MODEL_PATH, preprocessor_path=PREPROCESSOR_PATH, timer=None, profile_dir=None,
+                   backend='lightgbm', razones=0, grupos_razones=None):
+    n_workers = n_workers or os.cpu_count()
+    threads = max(1, os.cpu_count() // n_workers)
+    columns, partitions = split_partitions(input_path, partition_bytes)
+    timer = timer or StageTimer('batch')
+
+    sink = ResultSink(output_path)
+    total_rows, fuera_rango = 0, 0
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers, mp_context=mp.get_context('spawn'),
+                                 initializer=_init_worker,
+                                 initargs=(model_path, preprocessor_path, threads, profile_dir, backend,
+                                           razones, grupos_razones)) as executor:
+            futures = [executor.submit(_score_partition, input_path, start, end, columns)
+                       for start, end in partitions]
+            # Se escribe en el orden de las particiones: la salida es determinista
+            for future in futures:
+                df_result, n_fuera, etapas = future.result()
+                with timer.activo(), stage('serializacion'):
+                    sink.write(df_result)
+                timer.merge(etapas, len(df_result))
+                total_rows += len(df_result)
+                fuera_rango += n_fuera
+    finally:
+        sink.close()
+
+    return total_rows, fuera_rango
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Puntuación en paralelo de un archivo separado por '|'")
+    parser.add_argument('input_path')
+    parser.add_argument('output_path', help="Destino .csv o .parquet")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--partition-mb', type=int, default=32)
+    parser.add_argument('--backend', choices=BACKENDS, default='lightgbm')
+    parser.add_argument('--razones', type=int, default=0, metavar='K', help="Códigos de razón por cliente")
+    parser.add_argument('--razones-grupos', nargs='+', default=None, metavar='GRUPO',
+                        help="Explica solo estos grupos de riesgo (p. ej. t6 t7 t8)")
+    parser.add_argument('--profile', default=None, metavar='SALIDA.prof',
+                        help="Perfil cProfile de los workers, consolidado en un archivo pstats")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    timer = StageTimer('batch')
+    with tempfile.TemporaryDirectory() as profile_dir:
+        n, fuera = score_parallel(args.input_path, args.output_path, n_workers=args.workers,
+                                  partition_bytes=args.partition_mb * 1024 ** 2, timer=timer,
+                                  profile_dir=profile_dir if args.profile else None, backend=args.backend,
+                                  razones=args.razones, grupos_razones=args.razones_grupos)
+        if args.profile:
+            import pstats
+
+            perfiles = [os.path.join(profile_dir, nombre) for nombre in sorted(os.listdir(profile_dir))]
+            stats = pstats.Stats(*perfiles)
+            stats.dump_stats(args.profile)
+            stats.sort_stats('cumulative').print_stats(25)
+    timer.finish()
+    print(f"{n} registros puntuados en {args.output_path} ({fuera} fuera de rango)")
@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+class PredictionCache:
+    def __init__(self, max_size=100_000, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def set_version(self, version: str):
+        # Un cambio de modelo o de preprocesamiento invalida todas las entradas
+        with self._lock:
+            if version != self.version:
+                self._data.clear()
+                self.version = version
+
+    def keys_for(self, features: pd.DataFrame, version=None) -> np.ndarray:
+        # Huella por fila del vector de variables crudas; la versión del predictor que consulta
+        # entra como semilla del hash (en un cambio en caliente el predictor anterior sigue
+        # atendiendo solicitudes en curso con su propia versión)
+        hash_key = (version or self.version or '').ljust(16, '0')[:16]
+        return pd.util.hash_pandas_object(features, index=False, hash_key=hash_key).values
+
+    def get_many(self, keys: np.ndarray) -> tuple:
+        values = np.full(len(keys), np.nan)
+        found = np.zeros(len(keys), dtype=bool)
+        now = time.monotonic()
+        with self._lock:
+            for i, key in enumerate(keys.tolist()):
+                entry = self._data.get(key)
+                if entry is None:
+                    continue
+                expires_at, value = entry
+                if expires_at < now:
+                    del self._data[key]
+                    continue
+                self._data.move_to_end(key)
+                values[i] = value
+                found[i] = True
+            n_found = int(found.sum())
+            self.hits += n_found
+            self.misses += len(keys) - n_found
+        return values, found
+
+    def put_many(self, keys: np.ndarray, values: np.ndarray, version=None):
+        # Los resultados de una versión que ya no es la vigente se descartan
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            for key, value in zip(keys.tolist(), values.tolist()):
+                self._data[key] = (expires_at, value)
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'version': self.version,
+            }
@@ -0,0 +1,116 @@
+import numpy as np
+
+from data_preparation import DataCleaner
+
+
+# Versión NumPy del preprocesamiento congelado (DataCleaner.transform + ColumnTransformer)
+# limitada a las columnas de salida seleccionadas: no construye DataFrames ni recorre
+# pipelines de sklearn, pensada para puntuar uno o pocos registros con baja latencia.
+class CompiledPreprocessor:
+    def __init__(self, output_columns, num_sources, num_positions, num_params, cat_specs):
+        self.output_columns = output_columns
+        self.num_sources = num_sources
+        self.num_positions = num_positions
+        # Matriz (5, k): límite inferior, límite superior, mediana, media y escala
+        self.num_params = num_params
+        self.cat_specs = cat_specs
+        self.raw_columns = num_sources + [spec['source'] for spec in cat_specs]
+
+    @classmethod
+    def from_preprocessor(cls, model_preprocessor) -> 'CompiledPreprocessor':
+        if not model_preprocessor.is_fitted or model_preprocessor.cleaner is None:
+            raise RuntimeError("Se requiere un ModelPreprocessor ajustado y con limpieza")
+
+        cleaner = model_preprocessor.cleaner
+        ct = model_preprocessor.preprocessor
+        num_pipe = ct.named_transformers_['num']
+        cat_pipe = ct.named_transformers_['cat']
+        output_columns = model_preprocessor.output_columns
+        position = {col: j for j, col in enumerate(output_columns)}
+
+        num_sources, num_params, num_positions = [], [], []
+        for i, col in enumerate(model_preprocessor.num_cols):
+            if col not in position:
+                continue
+            lower, upper = cleaner.winsor_bounds_.get(col, (-np.inf, np.inf))
+            num_sources.append(col)
+            num_positions.append(position[col])
+            num_params.append([lower, upper, num_pipe['imputer'].statistics_[i],
+                               num_pipe['scaler'].mean_[i], num_pipe['scaler'].scale_[i]])
+
+        cat_specs = []
+        encoder = cat_pipe['encoder']
+        for i, col in enumerate(model_preprocessor.cat_cols):
+            bins, labels = DataCleaner.CATEGORY_BINS[col]
+            if col in DataCleaner.UNKNOWN_CATEGORY_COLUMNS:
+                fill = 'desconocido'
+            else:
+                fill = cleaner.fill_values_.get(col)
+            # Código len(labels) = valor fuera de los cortes o faltante
+            code_labels = list(labels) + [fill if isinstance(fill, str) else cat_pipe['imputer'].statistics_[i]]
+            out_positions, table = [], []
+            for category in encoder.categories_[i]:
+                name = f"{col}_{category}"
+                if name in position:
+                    out_positions.append(position[name])
+                    table.append([label == category for label in code_labels])
+            if out_positions:
+                cat_specs.append({
+                    'source': col,
+                    'edges': np.asarray(bins, dtype=float),
+                    'positions': np.asarray(out_positions),
+                    'table': np.asarray(table, dtype=float).T,
+                })
+
+        return cls(output_columns, num_sources, np.asarray(num_positions),
+                   np.asarray(num_params, dtype=float).reshape(-1, 5).T, cat_specs)
+
+    def records_to_array(self, records) -> np.ndarray:
+        return np.array([[np.nan if rec.get(col) is None else rec[col] for col in self.raw_columns]
+                         for rec in records], dtype=float).reshape(len(records), len(self.raw_columns))
+
+    def transform_array(self, raw: np.ndarray) -> np.ndarray:
+        # raw: matriz (n, len(raw_columns)) en el orden de self.raw_columns
+        n = raw.shape[0]
+        k = len(self.num_sources)
+        X = np.empty((n, len(self.output_columns)), dtype=float)
+
+        lower, upper, median, mean, scale = self.num_params
+        num = np.clip(raw[:, :k], lower, upper)
+        num = np.where(np.isnan(num), median, num)
+        X[:, self.num_positions] = (num - mean) / scale
+
+        for offset, spec in enumerate(self.cat_specs):
+            values = raw[:, k + offset]
+            edges = spec['edges']
+            codes = np.searchsorted(edges, values, side='left') - 1
+            invalid = (codes < 0) | (codes >= len(edges) - 1) | np.isnan(values)
+            codes[invalid] = len(edges) - 1
+            X[:, spec['positions']] = spec['table'][codes]
+        return X
+
+    def transform_frame(self, df, dtype=np.float32) -> np.ndarray:
+        # Columna por columna sobre el DataFrame crudo: cada salida seleccionada se calcula en
+        # float64 (mismas operaciones que DataCleaner + ColumnTransformer) y se escribe en una
+        # matriz angosta de tipo dtype. Los temporales son de una sola columna.
+        X = np.empty((len(df), len(self.output_columns)), dtype=dtype)
+        for col, position, (lower, upper, median, mean, scale) in zip(
+                self.num_sources, self.num_positions, self.num_params.T):
+            values = df[col].to_numpy(dtype=np.float64, copy=True)
+            np.clip(values, lower, upper, out=values)
+            values[np.isnan(values)] = median
+            values -= mean
+            values /= scale
+            X[:, position] = values
+
+        for spec in self.cat_specs:
+            values = df[spec['source']].to_numpy(dtype=np.float64)
+            edges = spec['edges']
+            codes = np.searchsorted(edges, values, side='left') - 1
+            invalid = (codes < 0) | (codes >= len(edges) - 1) | np.isnan(values)
+            codes[invalid] = len(edges) - 1
+            X[:, spec['positions']] = spec['table'][codes]
+        return X
+
+    def transform_records(self, records) -> np.ndarray:
+        return self.transform_array(self.records_to_array(records))
@@ -6,7 +6,14 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SRC_PATH = os.path.join(BASE_DIR, 'src')
 DATA_PATH = os.path.join(BASE_DIR, 'data')
 MODEL_PATH = os.path.join(BASE_DIR, 'models', 'model.pkl')
+NATIVE_MODEL_PATH = os.path.join(BASE_DIR, 'models', 'model.txt')
+PREPROCESSOR_PATH = os.path.join(BASE_DIR, 'models', 'preprocessor.pkl')
 FEATURES_PATH = os.path.join(DATA_PATH, 'processed', 'selected_features.csv')
+BUCKETS_PATH = os.path.join(DATA_PATH, 'processed', 'risk_buckets.csv')
+DICTIONARY_PATH = os.path.join(DATA_PATH, 'raw', 'diccionario.xlsx')
+SCHEMA_PATH = os.path.join(DATA_PATH, 'processed', 'schema.json')
+DRIFT_BASELINE_PATH = os.path.join(DATA_PATH, 'processed', 'drift_baseline.json')
+REGISTRY_PATH = os.path.join(BASE_DIR, 'models', 'registry')
 
 if SRC_PATH not in sys.path:
     sys.path.insert(0, SRC_PATH)
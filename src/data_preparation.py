@@ -1,58 +1,164 @@
-
 import pandas as pd
 import numpy as np
 
 class DataCleaner:
+    # Cortes (intervalos cerrados a la derecha) y etiquetas de las variables categorizadas
+    CATEGORY_BINS = {
+        'CO01MOR098RO': ([-0.01, 25, 75, 100], ['bajo', 'medio', 'alto']),
+        'CO02MOR092TO': ([-0.01, 25, 75, 100], ['bajo', 'medio', 'alto']),
+        'disp309': ([0, 5, 9, 20], ['bajo', 'medio', 'alto']),
+        'CO01NUM002AH': ([-0.01, 0, 2, 5, 20], ['sin_ahorro', 'bajo', 'medio', 'alto']),
+    }
+    UNKNOWN_CATEGORY_COLUMNS = ['disp309', 'CO02MOR092TO', 'CO01MOR098RO']
+    DROP_COLUMNS = ['num_doc', 'f_analisis', 'tipo_cliente']
+
     def __init__(self, lower_winsor=0.1, upper_winsor=0.9):
         self.lower_winsor = lower_winsor
         self.upper_winsor = upper_winsor
+        # Estado ajustado: límites de winsorización por columna y valores de imputación
+        self.winsor_bounds_ = None
+        self.fill_values_ = None
+
+    @property
+    def is_fitted(self):
+        return self.winsor_bounds_ is not None
+
+    def fit(self, df: pd.DataFrame) -> 'DataCleaner':
+        self._fit_columns(df, self._categorize_columns(df))
+        return self
 
-    def clean(self, df: pd.DataFrame) -> pd.DataFrame:
-        df = df.copy()
-        df = self._drop_irrelevant_columns(df)
-        df = self._categorize_columns(df)
-        df = self._winsorize_numeric(df)
-        df = self._impute_missing_values(df)
+    def transform(self, df: pd.DataFrame, copy: bool = True) -> pd.DataFrame:
+        # Solo aplica el estado congelado: no recalcula cuantiles ni elimina filas,
+        # de modo que cada registro se limpia igual sin importar el tamaño del lote.
+        # copy=False (solo para quien es dueño de df) winsoriza en sitio las columnas numéricas.
+        if not self.is_fitted:
+            raise RuntimeError("DataCleaner no está ajustado: llame a fit() primero")
+        return self._apply(df, self._categorize_columns(df), copy)
+
+    def clean(self, df: pd.DataFrame, copy: bool = True) -> pd.DataFrame:
+        # Ajuste y transformación en una sola pasada: las columnas se categorizan una vez
+        categorized = self._categorize_columns(df)
+        self._fit_columns(df, categorized)
+        df = self._apply(df, categorized, copy)
         df = self._remove_duplicates(df)
         return df
 
-    def _drop_irrelevant_columns(self, df: pd.DataFrame) -> pd.DataFrame:
-        cols_to_drop = ['num_doc', 'f_analisis','tipo_cliente']
-        return df.drop(columns=cols_to_drop, errors='ignore')
-
-    def _categorize_columns(self, df: pd.DataFrame) -> pd.DataFrame:
-        df['CO01MOR098RO'] = pd.cut(df['CO01MOR098RO'], bins=[-0.01, 25, 75, 100],
-                                    labels=['bajo', 'medio', 'alto'])
-        df['CO02MOR092TO'] = pd.cut(df['CO02MOR092TO'], bins=[-0.01, 25, 75, 100],
-                                    labels=['bajo', 'medio', 'alto'])
-        df['disp309'] = pd.cut(df['disp309'], bins=[0, 5, 9, 20],
-                               labels=['bajo', 'medio', 'alto'])
-        df['CO01NUM002AH'] = pd.cut(df['CO01NUM002AH'], bins=[-0.01, 0, 2, 5, 20],
-                                    labels=['sin_ahorro', 'bajo', 'medio', 'alto'])
-        return df
+    def get_state(self) -> dict:
+        return {
+            'lower_winsor': self.lower_winsor,
+            'upper_winsor': self.upper_winsor,
+            'winsor_bounds': self.winsor_bounds_,
+            'fill_values': self.fill_values_,
+        }
 
-    def _winsorize_numeric(self, df: pd.DataFrame) -> pd.DataFrame:
-        numeric_cols = df.select_dtypes(include=['float64', 'int64']).drop(columns=['default'], errors='ignore').columns
-        for col in numeric_cols:
-            df[col] = self._winsorize_series(df[col])
-        return df
+    @classmethod
+    def from_state(cls, state: dict) -> 'DataCleaner':
+        cleaner = cls(lower_winsor=state['lower_winsor'], upper_winsor=state['upper_winsor'])
+        cleaner.winsor_bounds_ = state['winsor_bounds']
+        cleaner.fill_values_ = state['fill_values']
+        return cleaner
 
-    def _winsorize_series(self, s: pd.Series) -> pd.Series:
-        lower_val = s.quantile(self.lower_winsor)
-        upper_val = s.quantile(self.upper_winsor)
-        return s.clip(lower=lower_val, upper=upper_val)
-
-    def _impute_missing_values(self, df: pd.DataFrame) -> pd.DataFrame:
-        categorical_with_nans = ['disp309', 'CO02MOR092TO', 'CO01MOR098RO']
-        for col in categorical_with_nans:
-            if pd.api.types.is_categorical_dtype(df[col]):
-                if 'desconocido' not in df[col].cat.categories:
-                    df[col] = df[col].cat.add_categories('desconocido')
-            df[col] = df[col].fillna('desconocido')
-
-        if df['CO01NUM002AH'].isnull().sum() > 0:
-            df['CO01NUM002AH'] = df['CO01NUM002AH'].fillna(df['CO01NUM002AH'].mode()[0])
-        return df
+    def _fit_columns(self, df: pd.DataFrame, categorized: dict):
+        self.winsor_bounds_ = {}
+        qs = np.array([self.lower_winsor, self.upper_winsor]) * 100.0
+        for col in self._numeric_columns(df):
+            values = df[col].to_numpy()
+            # Ambos cuantiles en una sola selección; la copia sin NaN se puede reordenar en sitio
+            owned = values.dtype.kind == 'f'
+            values = values[~np.isnan(values)] if owned else values
+            if len(values):
+                lower_val, upper_val = np.percentile(values, qs, overwrite_input=owned)
+            else:
+                lower_val = upper_val = np.nan
+            self.winsor_bounds_[col] = (lower_val, upper_val)
+
+        ahorro = categorized['CO01NUM002AH']
+        counts = np.bincount(ahorro.codes[ahorro.codes >= 0], minlength=len(ahorro.categories))
+        self.fill_values_ = {'CO01NUM002AH': ahorro.categories[counts.argmax()] if counts.sum() else np.nan}
+
+    def _apply(self, df: pd.DataFrame, categorized: dict, copy: bool) -> pd.DataFrame:
+        # Arma el resultado columna a columna sin copiar el DataFrame completo
+        fill = self.fill_values_['CO01NUM002AH']
+        if not pd.isna(fill):
+            ahorro = categorized['CO01NUM002AH']
+            codes = ahorro.codes.copy()
+            codes[codes < 0] = ahorro.categories.get_loc(fill)
+            categorized['CO01NUM002AH'] = pd.Categorical.from_codes(codes, dtype=ahorro.dtype)
+
+        columns = {}
+        for col in df.columns:
+            if col in self.DROP_COLUMNS:
+                continue
+            if col in categorized:
+                columns[col] = categorized[col]
+            elif col in self.winsor_bounds_:
+                columns[col] = self._winsorize(df[col], *self.winsor_bounds_[col], copy)
+            elif isinstance(df[col].dtype, pd.api.extensions.ExtensionDtype):
+                # Enteros con nulos del esquema (Int8/Int16): to_numpy daría un arreglo object
+                columns[col] = df[col].array.copy() if copy else df[col].array
+            else:
+                columns[col] = df[col].to_numpy(copy=copy)
+        return pd.DataFrame(columns, index=df.index, copy=False)
+
+    def _categorize_columns(self, df: pd.DataFrame) -> dict:
+        # Mismo criterio que pd.cut (intervalos cerrados a la derecha) con un searchsorted por columna.
+        # Las columnas de UNKNOWN_CATEGORY_COLUMNS llevan 'desconocido' como código de faltante.
+        categorized = {}
+        for col, (bins, labels) in self.CATEGORY_BINS.items():
+            codes = np.searchsorted(np.asarray(bins, dtype=np.float64), df[col].to_numpy(), side='left') - 1
+            invalid = (codes < 0) | (codes >= len(labels))
+            categories = list(labels)
+            if col in self.UNKNOWN_CATEGORY_COLUMNS:
+                categories.append('desconocido')
+                codes[invalid] = len(labels)
+            else:
+                codes[invalid] = -1
+            categorized[col] = pd.Categorical.from_codes(codes, categories=categories, ordered=True)
+        return categorized
+
+    def _numeric_columns(self, df: pd.DataFrame) -> list:
+        # Selección de tipos sobre un marco vacío: mismas reglas que select_dtypes sin copiar datos
+        excluded = set(self.DROP_COLUMNS) | set(self.CATEGORY_BINS) | {'default'}
+        numeric = df.iloc[:0].select_dtypes(include='number').columns
+        return [col for col in numeric if col not in excluded]
+
+    @staticmethod
+    def _winsorize(series: pd.Series, lower_val, upper_val, copy: bool):
+        values = series.to_numpy()
+        # Un límite NaN no recorta, como en Series.clip
+        lower_val = -np.inf if np.isnan(lower_val) else lower_val
+        upper_val = np.inf if np.isnan(upper_val) else upper_val
+        if isinstance(series.dtype, pd.api.extensions.ExtensionDtype):
+            # Enteros con nulos: los límites son cuantiles fraccionarios, se recorta en float64
+            return np.clip(series.to_numpy(dtype=np.float64, na_value=np.nan), lower_val, upper_val)
+        if values.dtype.kind != 'f':
+            return series.clip(lower=lower_val, upper=upper_val).to_numpy()
+        cast = values.dtype.type
+        if cast(lower_val) != lower_val or cast(upper_val) != upper_val:
+            # Límite no representable en el tipo de la columna: Series.clip promueve a float64
+            return np.clip(values.astype(np.float64), lower_val, upper_val)
+        out = values if not copy and values.flags.writeable else None
+        return np.clip(values, cast(lower_val), cast(upper_val), out=out)
 
     def _remove_duplicates(self, df: pd.DataFrame) -> pd.DataFrame:
-        return df.drop_duplicates()
+        # Huella de 64 bits por fila y verificación exacta solo entre las filas con huella repetida
+        row_hash = np.zeros(len(df), dtype=np.uint64)
+        for col in df.columns:
+            values = df[col].array
+            if isinstance(values, pd.Categorical):
+                values = values.codes
+            else:
+                values = np.asarray(values)
+                if values.dtype.kind == 'f':
+                    # -0.0 y las distintas representaciones de NaN deben coincidir como en drop_duplicates
+                    values = values + 0.0
+                    values[np.isnan(values)] = np.nan
+            row_hash = row_hash * np.uint64(0x100000001B3) ^ pd.util.hash_array(values)
+
+        candidates = np.flatnonzero(pd.Series(row_hash).duplicated(keep=False).to_numpy())
+        if not len(candidates):
+            return df
+        duplicated = candidates[df.iloc[candidates].duplicated().to_numpy()]
+        keep = np.ones(len(df), dtype=bool)
+        keep[duplicated] = False
+        return df[keep]
@@ -1,7 +1,10 @@
 
 
+import functools
+
 import pandas as pd
 import numpy as np
+import joblib
 
 
 from sklearn.pipeline import Pipeline
@@ -10,15 +13,29 @@ from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.impute import SimpleImputer
 from sklearn.utils import resample
 
-from sklearn.linear_model import LogisticRegression
-from sklearn.feature_selection import SelectFromModel
-from statsmodels.stats.outliers_influence import variance_inflation_factor
-
 from data_preparation import DataCleaner
+from compiled_preprocessing import CompiledPreprocessor
+from metrics import stage
+
+
+from config import FEATURES_PATH, PREPROCESSOR_PATH
+
+
+@functools.lru_cache(maxsize=None)
+def load_selected_features(path=FEATURES_PATH) -> tuple:
+    return tuple(pd.read_csv(path)['feature'].tolist())
+
 
+def __getattr__(name):
+    # Compatibilidad: la selección de variables vive en feature_selection y solo se
+    # importa si se pide, para que la ruta de inferencia no cargue statsmodels.
+    if name == 'selected_features':
+        return list(load_selected_features())
+    if name == 'FeatureSelector':
+        from feature_selection import FeatureSelector
+        return FeatureSelector
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-from config import FEATURES_PATH
-selected_features = pd.read_csv(FEATURES_PATH)['feature'].tolist()
 
 class ModelPreprocessor:
     def __init__(self, target_column='default', apply_cleaning=True,balanceo=True):
@@ -28,11 +45,45 @@ class ModelPreprocessor:
         self.apply_cleaning = apply_cleaning
         self.preprocessor = None
         self.feature_names_out = None
-
-    def transform(self, df: pd.DataFrame) -> tuple:
+        self.cleaner = None
+        self.num_cols = None
+        self.cat_cols = None
+        self.output_columns = None
+        self._compiled = None
+
+    @property
+    def is_fitted(self):
+        return self.output_columns is not None
+
+    @property
+    def compiled(self):
+        # Versión NumPy del estado congelado, restringida a las columnas seleccionadas;
+        # None si no aplica (sin limpieza)
+        if self._compiled is None and self.is_fitted and self.cleaner is not None:
+            self._compiled = CompiledPreprocessor.from_preprocessor(self)
+        return self._compiled
+
+    def output_sources(self) -> list:
+        # Variable de buró de origen de cada columna de salida (selected_features.csv): las
+        # numéricas son la misma variable y cada dummy one-hot vuelve a su variable categórica
+        if not self.is_fitted:
+            raise RuntimeError("ModelPreprocessor no está ajustado: llame a fit() primero")
+        origen = {col: col for col in self.num_cols}
+        encoder = self.preprocessor.named_transformers_['cat']['encoder']
+        for col, categorias in zip(self.cat_cols, encoder.categories_):
+            origen.update({f"{col}_{categoria}": col for categoria in categorias})
+        return [origen[col] for col in self.output_columns]
+
+    def fit(self, df: pd.DataFrame) -> 'ModelPreprocessor':
+        self.fit_transform(df)
+        return self
+
+    def fit_transform(self, df: pd.DataFrame) -> tuple:
+        self._compiled = None
         if self.apply_cleaning:
-            cleaner = DataCleaner()
-            df = cleaner.clean(df)
+            self.cleaner = DataCleaner()
+            with stage('limpieza'):
+                df = self.cleaner.clean(df, copy=True)
 
         if self.balanceo:
             df_majority = df[df[self.target_column] == 0]
@@ -46,15 +97,10 @@ class ModelPreprocessor:
             df = pd.concat([df_majority_downsampled, df_minority])
             df = df.sample(frac=1, random_state=42)
 
-        if self.target_column in df.columns:
-            y = df[self.target_column]
-            X = df.drop(columns=[self.target_column])
-        else:
-            y = None
-            X = df.copy()
+        X, y = self._split_target(df)
 
-        num_cols = X.select_dtypes(include=['int64', 'float64']).columns.tolist()
-        cat_cols = X.select_dtypes(include=['object', 'category']).columns.tolist()
+        self.num_cols = X.select_dtypes(include='number').columns.tolist()
+        self.cat_cols = X.select_dtypes(include=['object', 'category']).columns.tolist()
 
         num_pipe = Pipeline([
             ('imputer', SimpleImputer(strategy='median')),
@@ -66,63 +112,115 @@ class ModelPreprocessor:
         ])
 
         self.preprocessor = ColumnTransformer([
-            ('num', num_pipe, num_cols),
-            ('cat', cat_pipe, cat_cols)
+            ('num', num_pipe, self.num_cols),
+            ('cat', cat_pipe, self.cat_cols)
         ])
 
-        X_processed = self.preprocessor.fit_transform(X)
-        ohe_cols = self.preprocessor.named_transformers_['cat']['encoder'].get_feature_names_out(cat_cols)
-        self.feature_names_out = num_cols + ohe_cols.tolist()
-        X_df = pd.DataFrame(X_processed, columns=self.feature_names_out)
+        with stage('transformacion'):
+            X_processed = self.preprocessor.fit_transform(X)
+        ohe_cols = self.preprocessor.named_transformers_['cat']['encoder'].get_feature_names_out(self.cat_cols)
+        self.feature_names_out = self.num_cols + ohe_cols.tolist()
+        X_df = pd.DataFrame(X_processed, columns=self.feature_names_out, index=X.index)
 
-        X_df = X_df.loc[:, X_df.columns.intersection(selected_features)]
+        X_df = X_df.loc[:, X_df.columns.intersection(load_selected_features())]
+        self.output_columns = X_df.columns.tolist()
         return X_df, y
 
+    def transform(self, df: pd.DataFrame) -> tuple:
+        # Sin estado ajustado se conserva el comportamiento histórico (ajustar sobre el lote)
+        if not self.is_fitted:
+            return self.fit_transform(df)
+        if self.compiled is None:
+            return self._transform_full(df)
+
+        X, y = self.transform_array(df, dtype=np.float64)
+        return pd.DataFrame(X, columns=self.output_columns, index=df.index), y
+
+    def transform_array(self, df: pd.DataFrame, dtype=np.float32, return_index=False) -> tuple:
+        # Solo las columnas seleccionadas, en una matriz angosta (float32 por defecto) que
+        # el booster consume directamente: sin one-hot denso de ancho completo ni DataFrames.
+        # return_index: agrega el índice de df de cada fila de X (la limpieza del ajuste sobre
+        # el lote puede descartar filas; la ruta compilada las conserva todas y devuelve df.index)
+        if not self.is_fitted:
+            X_df, y = self.fit_transform(df)
+            X, index = X_df.to_numpy(dtype=dtype), X_df.index
+        elif self.compiled is None:
+            X_df, y = self._transform_full(df)
+            X, index = X_df.to_numpy(dtype=dtype), X_df.index
+        else:
+            y = df[self.target_column] if self.target_column in df.columns else None
+            with stage('transformacion'):
+                X = self.compiled.transform_frame(df, dtype=dtype)
+            index = df.index
+        return (X, y, index) if return_index else (X, y)
+
+    def _transform_full(self, df: pd.DataFrame) -> tuple:
+        if self.apply_cleaning:
+            with stage('limpieza'):
+                df = self.cleaner.transform(df, copy=True)
+
+        X, y = self._split_target(df)
+        with stage('transformacion'):
+            X_processed = self.preprocessor.transform(X[self.num_cols + self.cat_cols])
+        X_df = pd.DataFrame(X_processed, columns=self.feature_names_out, index=X.index)
+        return X_df[self.output_columns], y
 
-class FeatureSelector:
-    def __init__(self, vif_threshold=10, corr_threshold=0.8):
-        self.vif_threshold = vif_threshold
-        self.corr_threshold = corr_threshold
-        self.selected_features = []
-
-    def remove_correlated(self, df: pd.DataFrame) -> pd.DataFrame:
-        corr_matrix = df.corr().abs()
-        upper = corr_matrix.where(np.triu(np.ones(corr_matrix.shape), k=1).astype(bool))
-        to_drop = [col for col in upper.columns if any(upper[col] > self.corr_threshold)]
-        self.corr_pairs = corr_matrix.where(np.triu(np.ones(corr_matrix.shape), k=1).astype(bool)).stack().reset_index()
-        self.corr_pairs.columns = ['var1', 'var2', 'correlation']
-        return df.drop(columns=to_drop), to_drop
-
-    def remove_vif(self, df: pd.DataFrame) -> pd.DataFrame:
-        features = df.columns.tolist()
-        while True:
-            vif_data = pd.DataFrame()
-            vif_data["feature"] = features
-            vif_data["VIF"] = [variance_inflation_factor(df[features].values, i) for i in range(len(features))]
-            max_vif = vif_data["VIF"].max()
-            if max_vif > self.vif_threshold:
-                drop_feat = vif_data.sort_values("VIF", ascending=False).iloc[0]["feature"]
-                features.remove(drop_feat)
-            else:
-                break
-        return df[features], list(set(df.columns) - set(features))
-
-    def lasso_selection(self, df: pd.DataFrame, y: pd.Series) -> pd.DataFrame:
-        model = LogisticRegression(penalty='l1', solver='liblinear', C=0.01)
-        model.fit(df, y)
-        selector = SelectFromModel(model, prefit=True)
-        self.selected_features = df.columns[selector.get_support()].tolist()
-        return df[self.selected_features]
-
-    def select(self, df: pd.DataFrame, y: pd.Series, export_path: str = None) -> pd.DataFrame:
-        df_corr, dropped_corr = self.remove_correlated(df)
-        df_vif, dropped_vif = self.remove_vif(df_corr)
-        df_lasso = self.lasso_selection(df_vif, y)
-
-        if export_path:
-            df_lasso.to_csv(export_path, index=False)
-
-        print(f"Correlación alta eliminada: {len(dropped_corr)}")
-        print(f"Colinealidad (VIF) eliminada: {len(dropped_vif)}")
-        print(f"Variables finales (Lasso): {len(self.selected_features)}")
-        return df_lasso
+    def _split_target(self, df: pd.DataFrame) -> tuple:
+        if self.target_column in df.columns:
+            y = df[self.target_column]
+            X = df.drop(columns=[self.target_column])
+        else:
+            y = None
+            X = df.copy()
+        return X, y
+
+    def get_state(self) -> dict:
+        if not self.is_fitted:
+            raise RuntimeError("ModelPreprocessor no está ajustado: llame a fit() primero")
+        return {
+            'target_column': self.target_column,
+            'apply_cleaning': self.apply_cleaning,
+            'cleaner': self.cleaner.get_state() if self.cleaner is not None else None,
+            'num_cols': self.num_cols,
+            'cat_cols': self.cat_cols,
+            'column_transformer': self.preprocessor,
+            'feature_names_out': self.feature_names_out,
+            'output_columns': self.output_columns,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'ModelPreprocessor':
+        preprocessor = cls(target_column=state['target_column'],
+                           apply_cleaning=state['apply_cleaning'], balanceo=False)
+        if state['cleaner'] is not None:
+            preprocessor.cleaner = DataCleaner.from_state(state['cleaner'])
+        preprocessor.num_cols = state['num_cols']
+        preprocessor.cat_cols = state['cat_cols']
+        preprocessor.preprocessor = state['column_transformer']
+        preprocessor.feature_names_out = state['feature_names_out']
+        preprocessor.output_columns = state['output_columns']
+        return preprocessor
+
+    def save(self, path=PREPROCESSOR_PATH):
+        joblib.dump(self.get_state(), path)
+
+    @classmethod
+    def load(cls, path=PREPROCESSOR_PATH) -> 'ModelPreprocessor':
+        return cls.from_state(joblib.load(path))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Ajusta y guarda el estado de preprocesamiento congelado")
+    parser.add_argument('input_path', help="Archivo de entrenamiento separado por '|'")
+    parser.add_argument('--output', default=PREPROCESSOR_PATH)
+    parser.add_argument('--sin-balanceo', action='store_true')
+    args = parser.parse_args()
+
+    from schema import read_raw
+
+    df = read_raw(args.input_path)
+    preprocessor = ModelPreprocessor(balanceo=not args.sin_balanceo).fit(df)
+    preprocessor.save(args.output)
+    print(f"Preprocesador guardado en {args.output} ({len(preprocessor.output_columns)} variables)")
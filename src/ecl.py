@@ -0,0 +1,155 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+# Escenarios macroeconómicos: peso de probabilidad y factores sobre la PD a 12 meses y la LGD
+ESCENARIOS = {
+    'base': {'peso': 1.0, 'factor_pd': 1.0, 'factor_lgd': 1.0},
+}
+
+
+class ECLEngine:
+    # Pérdida esperada IFRS9 (ECL = PD x LGD x EAD) vectorizada sobre todo el portafolio.
+    # La PD a 12 meses del modelo se convierte en una tasa de incumplimiento mensual constante,
+    # con lo que la suma descontada de pérdidas marginales tiene forma cerrada para cualquier plazo.
+    def __init__(self, escenarios=None, mora_etapa2=30, mora_etapa3=90, sicr_relativo=2.0,
+                 sicr_absoluto=0.05, grupos_etapa2=()):
+        self.escenarios = escenarios or ESCENARIOS
+        pesos = np.array([e['peso'] for e in self.escenarios.values()], dtype=float)
+        if not np.isclose(pesos.sum(), 1.0):
+            raise ValueError(f"Los pesos de los escenarios deben sumar 1 (suman {pesos.sum():.4f})")
+        self.mora_etapa2 = mora_etapa2
+        self.mora_etapa3 = mora_etapa3
+        self.sicr_relativo = sicr_relativo
+        self.sicr_absoluto = sicr_absoluto
+        self.grupos_etapa2 = tuple(grupos_etapa2)
+
+    def asignar_etapas(self, df: pd.DataFrame) -> np.ndarray:
+        # Etapa 3: mora > mora_etapa3. Etapa 2: mora > mora_etapa2, incremento significativo del
+        # riesgo frente a la PD de originación (relativo y absoluto) o grupo en vigilancia.
+        n = len(df)
+        mora = df['dias_mora'].to_numpy(dtype=float) if 'dias_mora' in df else np.zeros(n)
+        etapa = np.ones(n, dtype=np.int8)
+
+        etapa2 = mora > self.mora_etapa2
+        if 'pd_origen' in df:
+            pd_actual = df['probabilidad'].to_numpy(dtype=float)
+            pd_origen = df['pd_origen'].to_numpy(dtype=float)
+            etapa2 |= ((pd_actual >= self.sicr_relativo * pd_origen)
+                       & (pd_actual - pd_origen >= self.sicr_absoluto))
+        if self.grupos_etapa2:
+            etapa2 |= df['grupo_riesgo'].isin(self.grupos_etapa2).to_numpy()
+
+        etapa[etapa2] = 2
+        etapa[mora > self.mora_etapa3] = 3
+        return etapa
+
+    @staticmethod
+    def _unir(resultados: pd.DataFrame, exposiciones: pd.DataFrame) -> pd.DataFrame:
+        resultados = resultados[resultados['num_doc'].notna()]
+        for nombre, tabla in (('resultados', resultados), ('exposiciones', exposiciones)):
+            duplicados = tabla['num_doc'][tabla['num_doc'].duplicated()].unique()
+            if len(duplicados):
+                raise ValueError(f"num_doc duplicado en {nombre} ({len(duplicados)}): "
+                                 f"{', '.join(map(str, duplicados[:5]))}")
+        df = exposiciones.merge(resultados, on='num_doc', how='left', indicator=True)
+        sin_pd = (df.pop('_merge') == 'left_only').to_numpy()
+        if sin_pd.any():
+            raise ValueError(f"{sin_pd.sum()} exposiciones sin PD en los resultados "
+                             f"(EAD {df.loc[sin_pd, 'ead'].sum():,.2f}): "
+                             f"{', '.join(map(str, df.loc[sin_pd, 'num_doc'].head(5)))}")
+        # Mismo orden de columnas que la salida de RiskPredictor seguida de las exposiciones
+        return df[resultados.columns.tolist() + [c for c in df.columns if c not in resultados.columns]]
+
+    @staticmethod
+    def _perdida_descontada(pd_12m, tasa, meses):
+        # Suma_{m=1..T} (1-h)^(m-1) * h * d^m con h mensual y d = (1 + tasa)^(-1/12):
+        # serie geométrica de razón q = (1-h) * d. Todas las entradas con forma (escenarios, exposiciones).
+        h = 1.0 - (1.0 - pd_12m) ** (1.0 / 12.0)
+        d = (1.0 + tasa) ** (-1.0 / 12.0)
+        q = (1.0 - h) * d
+        with np.errstate(divide='ignore', invalid='ignore'):
+            suma = np.where(q != 1.0, (1.0 - q ** meses) / (1.0 - q), meses)
+        return h * d * suma
+
+    def calcular(self, resultados: pd.DataFrame, exposiciones: pd.DataFrame) -> pd.DataFrame:
+        # resultados: salida de RiskPredictor (num_doc, probabilidad, grupo_riesgo).
+        # exposiciones: num_doc, ead, lgd, tasa (efectiva anual), plazo_meses y, opcionales,
+        # dias_mora y pd_origen. Toda exposición debe tener su PD: una exposición sin puntaje
+        # subestimaría la provisión, así que se rechaza en lugar de descartarse.
+        df = self._unir(resultados, exposiciones)
+
+        etapa = self.asignar_etapas(df)
+        ead = df['ead'].to_numpy(dtype=float)
+        lgd = df['lgd'].to_numpy(dtype=float)
+        tasa = df['tasa'].to_numpy(dtype=float)
+        meses = np.maximum(df['plazo_meses'].to_numpy(dtype=float), 1.0)
+
+        # Escenarios como primer eje: una sola pasada de arreglos (S, N) sin bucles por fila
+        pesos = np.array([e['peso'] for e in self.escenarios.values()])[:, None]
+        factor_pd = np.array([e.get('factor_pd', 1.0) for e in self.escenarios.values()])[:, None]
+        factor_lgd = np.array([e.get('factor_lgd', 1.0) for e in self.escenarios.values()])[:, None]
+
+        pd_12m = np.clip(df['probabilidad'].to_numpy(dtype=float)[None, :] * factor_pd, 0.0, 1.0)
+        lgd_s = np.clip(lgd[None, :] * factor_lgd, 0.0, 1.0)
+        perdida = lgd_s * ead[None, :]
+
+        ecl_12m = (pesos * perdida * self._perdida_descontada(pd_12m, tasa, np.minimum(meses, 12.0))).sum(axis=0)
+        ecl_vida = (pesos * perdida * self._perdida_descontada(pd_12m, tasa, meses)).sum(axis=0)
+        pd_vida = (pesos * (1.0 - (1.0 - pd_12m) ** (meses / 12.0))).sum(axis=0)
+        ecl_incumplido = (pesos * perdida).sum(axis=0)
+
+        df['etapa'] = etapa
+        df['pd_12m'] = (pesos * pd_12m).sum(axis=0)
+        df['pd_vida'] = pd_vida
+        df['ecl_12m'] = ecl_12m
+        df['ecl_vida'] = ecl_vida
+        df['ecl'] = np.select([etapa == 1, etapa == 2], [ecl_12m, ecl_vida], ecl_incumplido)
+        return df
+
+    @staticmethod
+    def resumen(df: pd.DataFrame) -> pd.DataFrame:
+        # Provisión por grupo de riesgo y etapa
+        agregado = df.groupby(['grupo_riesgo', 'etapa'], observed=True).agg(
+            exposiciones=('ead', 'size'),
+            ead=('ead', 'sum'),
+            ecl=('ecl', 'sum'),
+            pd_12m=('pd_12m', 'mean'),
+        ).reset_index()
+        agregado['cobertura'] = agregado['ecl'] / agregado['ead']
+        return agregado
+
+
+def load_escenarios(path) -> dict:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _read_table(path) -> pd.DataFrame:
+    return pd.read_parquet(path) if str(path).endswith('.parquet') else pd.read_csv(path)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pérdida esperada IFRS9 sobre las predicciones del modelo")
+    parser.add_argument('resultados', help="Salida de predict.py (.csv o .parquet)")
+    parser.add_argument('exposiciones', help="num_doc, ead, lgd, tasa, plazo_meses [, dias_mora, pd_origen]")
+    parser.add_argument('output_path', help="Detalle por exposición (.csv o .parquet)")
+    parser.add_argument('--escenarios', default=None, help="JSON {nombre: {peso, factor_pd, factor_lgd}}")
+    parser.add_argument('--resumen', default=None, help="CSV con la provisión por grupo de riesgo y etapa")
+    args = parser.parse_args()
+
+    engine = ECLEngine(escenarios=load_escenarios(args.escenarios) if args.escenarios else None)
+    detalle = engine.calcular(_read_table(args.resultados), _read_table(args.exposiciones))
+    if args.output_path.endswith('.parquet'):
+        detalle.to_parquet(args.output_path, index=False)
+    else:
+        detalle.to_csv(args.output_path, index=False)
+
+    resumen = engine.resumen(detalle)
+    if args.resumen:
+        resumen.to_csv(args.resumen, index=False)
+    print(resumen.to_string(index=False))
+    print(f"ECL total: {detalle['ecl'].sum():,.2f}")
@@ -0,0 +1,32 @@
+import argparse
+import os
+
+import joblib
+
+from config import MODEL_PATH, NATIVE_MODEL_PATH
+
+
+def export_native(model_path=MODEL_PATH, output_path=NATIVE_MODEL_PATH):
+    model = joblib.load(model_path)
+    booster = getattr(model, 'booster_', None)
+    if booster is None:
+        raise ValueError(f"{type(model).__name__} no tiene un booster de LightGBM exportable")
+    booster.save_model(output_path)
+    return output_path
+
+
+def native_model(model_path=MODEL_PATH, output_path=NATIVE_MODEL_PATH):
+    # model.txt es un artefacto derivado (no versionado): se regenera si falta o si model.pkl
+    # es más reciente, para no puntuar nunca con una copia vieja del modelo
+    if not os.path.exists(output_path) or os.path.getmtime(output_path) < os.path.getmtime(model_path):
+        export_native(model_path, output_path)
+    return output_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Exporta model.pkl al formato nativo de LightGBM")
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--output', default=NATIVE_MODEL_PATH)
+    args = parser.parse_args()
+
+    print(f"Modelo nativo guardado en {export_native(args.model, args.output)}")
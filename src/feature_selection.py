@@ -0,0 +1,130 @@
+import pandas as pd
+import numpy as np
+from joblib import Parallel, delayed
+
+from sklearn.linear_model import LogisticRegression
+from sklearn.feature_selection import SelectFromModel
+from statsmodels.stats.outliers_influence import variance_inflation_factor
+
+
+class VIFEngine:
+    # VIF de todas las variables a la vez desde la inversa de la matriz de Gram G = X'X:
+    # la SSR de regresar x_i sobre las demás es 1 / inv(G)_ii, así que
+    # VIF_i = TSS_i * inv(G)_ii. Igual que statsmodels, la TSS es centrada solo cuando
+    # las demás variables contienen una constante (explícita o implícita).
+    # Al eliminar una variable la inversa se actualiza en O(p^2) (complemento de Schur).
+    def __init__(self, X: np.ndarray):
+        self.X = np.asarray(X, dtype=float)
+        self.n = self.X.shape[0]
+        self.active = np.arange(self.X.shape[1])
+        self.col_sums = self.X.sum(axis=0)
+        self.gram_diag = np.einsum('ij,ij->j', self.X, self.X)
+        self._factorize()
+
+    def _factorize(self):
+        X = self.X[:, self.active]
+        rank = np.linalg.matrix_rank(X)
+        self.full_rank = rank == len(self.active)
+        self.inv = None
+        if not self.full_rank:
+            return
+        self.inv = np.linalg.inv(X.T @ X)
+        # Representación de la constante en el espacio columna: 1 = X c
+        rank_augm = np.linalg.matrix_rank(np.column_stack((np.ones(self.n), X)))
+        if rank_augm == rank:
+            c = self.inv @ self.col_sums[self.active]
+            self.const_coef = np.where(np.abs(c) <= 1e-8 * np.abs(c).max(), 0.0, c)
+        else:
+            self.const_coef = None
+
+    def vifs(self) -> np.ndarray:
+        if not self.full_rank:
+            X = self.X[:, self.active]
+            return np.array([variance_inflation_factor(X, i) for i in range(len(self.active))])
+
+        tss = self.gram_diag[self.active].copy()
+        if self.const_coef is not None:
+            # Si c_i = 0 las demás variables generan la constante sin x_i: TSS centrada
+            centered = self.const_coef == 0
+            sums = self.col_sums[self.active]
+            tss[centered] -= sums[centered] ** 2 / self.n
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return tss * np.diag(self.inv)
+
+    def drop(self, position: int):
+        keep = np.arange(len(self.active)) != position
+        self.active = self.active[keep]
+        if not self.full_rank:
+            self._factorize()
+            return
+        inv = self.inv
+        self.inv = inv[np.ix_(keep, keep)] - np.outer(inv[keep, position], inv[position, keep]) / inv[position, position]
+        if self.const_coef is not None:
+            if self.const_coef[position] != 0:
+                self.const_coef = None
+            else:
+                self.const_coef = self.const_coef[keep]
+
+
+class FeatureSelector:
+    def __init__(self, vif_threshold=10, corr_threshold=0.8, lasso_C=0.01, n_jobs=None):
+        self.vif_threshold = vif_threshold
+        self.corr_threshold = corr_threshold
+        self.lasso_C = lasso_C
+        self.n_jobs = n_jobs
+        self.selected_features = []
+
+    def remove_correlated(self, df: pd.DataFrame) -> pd.DataFrame:
+        corr_matrix = df.corr().abs()
+        upper = corr_matrix.where(np.triu(np.ones(corr_matrix.shape), k=1).astype(bool))
+        to_drop = upper.columns[(upper > self.corr_threshold).any(axis=0)].tolist()
+        self.corr_pairs = upper.stack().reset_index()
+        self.corr_pairs.columns = ['var1', 'var2', 'correlation']
+        return df.drop(columns=to_drop), to_drop
+
+    def remove_vif(self, df: pd.DataFrame) -> pd.DataFrame:
+        features = df.columns.tolist()
+        engine = VIFEngine(df.values)
+        while features:
+            vif = pd.Series(engine.vifs())
+            if not vif.max() > self.vif_threshold:
+                break
+            # Mismo criterio de desempate que el orden descendente de pandas
+            position = int(vif.sort_values(ascending=False).index[0])
+            if vif[position] > self.vif_threshold:
+                features.pop(position)
+                engine.drop(position)
+            else:
+                break
+        return df[features], list(set(df.columns) - set(features))
+
+    def lasso_selection(self, df: pd.DataFrame, y: pd.Series) -> pd.DataFrame:
+        support = _lasso_support(df, y, self.lasso_C)
+        self.selected_features = df.columns[support].tolist()
+        return df[self.selected_features]
+
+    def lasso_path(self, df: pd.DataFrame, y: pd.Series, Cs) -> pd.DataFrame:
+        # Ajusta la regresión L1 para varios C en paralelo; filas = C, columnas = variables
+        supports = Parallel(n_jobs=self.n_jobs)(delayed(_lasso_support)(df, y, C) for C in Cs)
+        self.lasso_path_ = pd.DataFrame(supports, index=pd.Index(Cs, name='C'), columns=df.columns)
+        return self.lasso_path_
+
+    def select(self, df: pd.DataFrame, y: pd.Series, export_path: str = None) -> pd.DataFrame:
+        df_corr, dropped_corr = self.remove_correlated(df)
+        df_vif, dropped_vif = self.remove_vif(df_corr)
+        df_lasso = self.lasso_selection(df_vif, y)
+
+        if export_path:
+            df_lasso.to_csv(export_path, index=False)
+
+        print(f"Correlación alta eliminada: {len(dropped_corr)}")
+        print(f"Colinealidad (VIF) eliminada: {len(dropped_vif)}")
+        print(f"Variables finales (Lasso): {len(self.selected_features)}")
+        return df_lasso
+
+
+def _lasso_support(df: pd.DataFrame, y: pd.Series, C: float) -> np.ndarray:
+    model = LogisticRegression(penalty='l1', solver='liblinear', C=C)
+    model.fit(df, y)
+    selector = SelectFromModel(model, prefit=True)
+    return selector.get_support()
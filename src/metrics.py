@@ -0,0 +1,131 @@
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+try:
+    import prometheus_client
+except ImportError:  # prometheus_client es opcional: sin él solo quedan los logs estructurados
+    prometheus_client = None
+
+logger = logging.getLogger('scoring')
+
+if prometheus_client is not None:
+    STAGE_SECONDS = prometheus_client.Histogram(
+        'scoring_stage_seconds', 'Duración de cada etapa del pipeline de puntuación', ['etapa'],
+        buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+    )
+    ROWS = prometheus_client.Counter('scoring_rows_total', 'Registros puntuados', ['endpoint'])
+    REQUEST_SECONDS = prometheus_client.Histogram(
+        'scoring_request_seconds', 'Duración total de cada solicitud de puntuación', ['endpoint'],
+    )
+    PEAK_MEMORY = prometheus_client.Gauge('scoring_peak_memory_bytes', 'Memoria residente máxima del proceso')
+else:
+    STAGE_SECONDS = ROWS = REQUEST_SECONDS = PEAK_MEMORY = None
+
+# Temporizadores activos en el hilo actual: una etapa se acumula en todos ellos
+_local = threading.local()
+
+
+def peak_memory_bytes() -> int:
+    try:
+        import resource
+        import sys
+
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == 'darwin' else maxrss * 1024
+    except ImportError:
+        import psutil
+
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss)
+
+
+@contextmanager
+def stage(nombre: str):
+    # Etapas: lectura, limpieza, transformacion, prediccion, grupos, razones, monitoreo, serializacion.
+    # Costo por etapa: dos perf_counter y una observación del histograma
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        if STAGE_SECONDS is not None:
+            STAGE_SECONDS.labels(nombre).observe(elapsed)
+        for timer in getattr(_local, 'timers', ()):
+            timer.etapas[nombre] += elapsed
+
+
+class StageTimer:
+    # Desglose por solicitud o por lote: tiempos por etapa, filas y memoria máxima,
+    # emitido como una línea JSON en el logger 'scoring'.
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.etapas = defaultdict(float)
+        self.filas = 0
+        self._t0 = time.perf_counter()
+
+    @contextmanager
+    def activo(self):
+        timers = getattr(_local, 'timers', None)
+        if timers is None:
+            timers = _local.timers = []
+        timers.append(self)
+        try:
+            yield self
+        finally:
+            timers.remove(self)
+
+    def add_rows(self, n: int):
+        self.filas += n
+
+    def merge(self, etapas: dict, filas: int = 0):
+        for nombre, segundos in etapas.items():
+            self.etapas[nombre] += segundos
+        self.filas += filas
+
+    def finish(self) -> dict:
+        total = time.perf_counter() - self._t0
+        memoria = peak_memory_bytes()
+        if prometheus_client is not None:
+            ROWS.labels(self.endpoint).inc(self.filas)
+            REQUEST_SECONDS.labels(self.endpoint).observe(total)
+            PEAK_MEMORY.set(memoria)
+        registro = {
+            'evento': 'scoring',
+            'endpoint': self.endpoint,
+            'filas': self.filas,
+            'total_ms': round(total * 1000, 3),
+            'etapas_ms': {nombre: round(s * 1000, 3) for nombre, s in self.etapas.items()},
+            'filas_por_segundo': round(self.filas / total, 1) if total else None,
+            'memoria_max_mb': round(memoria / 1024 ** 2, 1),
+        }
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(registro, ensure_ascii=False))
+        return registro
+
+
+def latest():
+    # Texto de exposición de Prometheus; None si prometheus_client no está instalado
+    if prometheus_client is None:
+        return None
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
+
+
+@contextmanager
+def profiled(output_path, top=25):
+    # Perfil cProfile de un lote: se guarda en formato pstats (snakeviz, gprof2dot, flameprof)
+    # y se imprime el resumen por tiempo acumulado.
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(output_path)
+        pstats.Stats(output_path).sort_stats('cumulative').print_stats(top)
@@ -0,0 +1,183 @@
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+
+from config import DRIFT_BASELINE_PATH
+
+# Umbrales habituales de PSI: < 0.1 estable, 0.1 - 0.25 cambio moderado, > 0.25 cambio significativo
+PSI_MODERADO = 0.1
+PSI_SIGNIFICATIVO = 0.25
+EPSILON = 1e-4
+SMALL_BATCH = 256
+
+
+def _bin_codes(values: np.ndarray, edges: np.ndarray, nan_bin: int) -> np.ndarray:
+    # Intervalos [e_(i-1), e_i); los faltantes van a su propio bin al final
+    codes = np.searchsorted(edges, values, side='right')
+    codes[np.isnan(values)] = nan_bin
+    return codes
+
+
+def psi(expected: np.ndarray, actual: np.ndarray) -> np.ndarray:
+    # PSI por fila: suma((a - e) * ln(a / e)) sobre proporciones con piso EPSILON
+    e = np.maximum(expected, EPSILON)
+    a = np.maximum(actual, EPSILON)
+    return ((a - e) * np.log(a / e)).sum(axis=-1)
+
+
+def build_baseline(df: pd.DataFrame, grupos: pd.Categorical, features, n_bins=10) -> dict:
+    # Cortes por deciles del entrenamiento; cortes repetidos (masas puntuales) se colapsan
+    baseline = {'n': len(df), 'features': {}}
+    for col in features:
+        values = df[col].to_numpy(dtype=float)
+        edges = np.unique(np.nanquantile(values, np.linspace(0, 1, n_bins + 1)[1:-1]))
+        edges = edges[~np.isnan(edges)]
+        counts = np.bincount(_bin_codes(values, edges, len(edges) + 1), minlength=len(edges) + 2)
+        baseline['features'][col] = {
+            'edges': edges.tolist(),
+            'proporciones': (counts / len(values)).tolist(),
+        }
+    counts = np.bincount(grupos.codes[grupos.codes >= 0], minlength=len(grupos.categories))
+    baseline['grupos'] = {
+        'categorias': grupos.categories.tolist(),
+        'proporciones': (counts / max(counts.sum(), 1)).tolist(),
+    }
+    return baseline
+
+
+def save_baseline(baseline: dict, path=DRIFT_BASELINE_PATH):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2)
+
+
+def load_baseline(path=DRIFT_BASELINE_PATH) -> dict:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class DriftMonitor:
+    # Histogramas acumulados por variable y por grupo de riesgo sobre los cortes fijos de la
+    # línea base: memoria constante sin importar cuántos registros se puntúen.
+    def __init__(self, baseline: dict):
+        self.features = list(baseline['features'])
+        self._edges = [np.asarray(spec['edges'], dtype=float) for spec in baseline['features'].values()]
+        # Tabla rectangular: bins de cada variable + bin de faltantes en la última columna
+        self.n_bins = max(len(edges) for edges in self._edges) + 2
+        self._expected = np.zeros((len(self.features), self.n_bins))
+        for i, spec in enumerate(baseline['features'].values()):
+            proporciones = spec['proporciones']
+            self._expected[i, :len(proporciones) - 1] = proporciones[:-1]
+            self._expected[i, -1] = proporciones[-1]
+        self._offsets = np.arange(len(self.features)) * self.n_bins
+        # Cortes en matriz (variables x cortes) rellena con NaN, para lotes pequeños
+        self._edge_matrix = np.full((len(self.features), self.n_bins - 2), np.nan)
+        for i, edges in enumerate(self._edges):
+            self._edge_matrix[i, :len(edges)] = edges
+
+        self.grupos = baseline['grupos']['categorias']
+        self._grupo_index = {grupo: i for i, grupo in enumerate(self.grupos)}
+        self._grupos_expected = np.asarray(baseline['grupos']['proporciones'], dtype=float)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counts = np.zeros((len(self.features), self.n_bins), dtype=np.int64)
+            self._grupo_counts = np.zeros(len(self.grupos), dtype=np.int64)
+            self.n = 0
+
+    def update(self, df: pd.DataFrame, grupos):
+        self._update_array(df[self.features].to_numpy(dtype=float), grupos)
+
+    def update_records(self, records, grupos):
+        X = np.array([[rec.get(col) for col in self.features] for rec in records], dtype=float)
+        self._update_array(X, grupos)
+
+    def _update_array(self, X, grupos):
+        if not len(X):
+            return
+        if len(X) <= SMALL_BATCH:
+            # Una comparación contra todos los cortes a la vez; NaN en la matriz nunca cuenta
+            codes = (self._edge_matrix[None, :, :] <= X[:, :, None]).sum(axis=2)
+            codes[np.isnan(X)] = self.n_bins - 1
+        else:
+            codes = np.empty(X.shape, dtype=np.int64)
+            for j, edges in enumerate(self._edges):
+                codes[:, j] = _bin_codes(X[:, j], edges, self.n_bins - 1)
+        # Un solo bincount para todas las variables: cada una ocupa su bloque de n_bins posiciones
+        counts = np.bincount((codes + self._offsets).ravel(), minlength=self._counts.size)
+
+        if isinstance(grupos, pd.Categorical) and grupos.categories.tolist() == self.grupos:
+            grupo_codes = grupos.codes
+        else:
+            grupo_codes = np.array([self._grupo_index.get(g, -1) for g in grupos], dtype=np.int64)
+        grupo_counts = np.bincount(grupo_codes[grupo_codes >= 0], minlength=len(self.grupos))
+
+        with self._lock:
+            self._counts += counts.reshape(self._counts.shape)
+            self._grupo_counts += grupo_counts
+            self.n += len(X)
+
+    def report(self) -> dict:
+        with self._lock:
+            counts = self._counts.copy()
+            grupo_counts = self._grupo_counts.copy()
+            n = self.n
+        if not n:
+            return {'n': 0}
+
+        csi = psi(self._expected, counts / n)
+        grupos_actual = grupo_counts / max(grupo_counts.sum(), 1)
+        psi_grupos = float(psi(self._grupos_expected, grupos_actual))
+        return {
+            'n': n,
+            'psi_grupos': psi_grupos,
+            'estado': _estado(psi_grupos),
+            'histograma_grupos': {
+                grupo: {'base': float(e), 'actual': float(a)}
+                for grupo, e, a in zip(self.grupos, self._grupos_expected, grupos_actual)
+            },
+            'csi': {col: float(v) for col, v in zip(self.features, csi)},
+            'alertas': [col for col, v in zip(self.features, csi) if v > PSI_SIGNIFICATIVO],
+        }
+
+
+def _estado(valor: float) -> str:
+    if valor > PSI_SIGNIFICATIVO:
+        return 'significativo'
+    if valor > PSI_MODERADO:
+        return 'moderado'
+    return 'estable'
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from config import MODEL_PATH
+    from predict import RiskPredictor
+    from schema import iter_raw, read_raw
+
+    parser = argparse.ArgumentParser(description="Estabilidad poblacional (PSI/CSI) frente a la línea base")
+    parser.add_argument('--model', default=MODEL_PATH)
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    build = subparsers.add_parser('build', help="Genera la línea base a partir del archivo de entrenamiento")
+    build.add_argument('train_path')
+    build.add_argument('--output', default=DRIFT_BASELINE_PATH)
+    drift = subparsers.add_parser('drift', help="Calcula PSI/CSI de un archivo frente a la línea base")
+    drift.add_argument('input_path')
+    args = parser.parse_args()
+
+    if args.comando == 'build':
+        predictor = RiskPredictor(args.model)
+        df = read_raw(args.train_path)
+        grupos = predictor.predict_from_dataframe(df)['grupo_riesgo'].values
+        features = predictor.preprocessor.num_cols + predictor.preprocessor.cat_cols
+        save_baseline(build_baseline(df, grupos, features), args.output)
+        print(f"Línea base con {len(features)} variables guardada en {args.output}")
+    else:
+        predictor = RiskPredictor(args.model, monitor=DriftMonitor(load_baseline()))
+        for chunk in iter_raw(args.input_path):
+            predictor.predict_from_dataframe(chunk)
+        print(json.dumps(predictor.monitor.report(), indent=2, ensure_ascii=False))
@@ -1,68 +1,325 @@
+import hashlib
+import logging
+import os
 
+import numpy as np
 import pandas as pd
 import joblib
 
+from config import PREPROCESSOR_PATH, BUCKETS_PATH
+from data_preprocesing import ModelPreprocessor
+from schema import read_raw, iter_raw, BLOCK_SIZE
+from tree_inference import FlatForest
+from metrics import stage, StageTimer
+
+logger = logging.getLogger(__name__)
+
+FUERA_RANGO = 'fuera_rango'
+# lightgbm: booster nativo (C++, multihilo). numpy: ensamble aplanado en arreglos (tree_inference)
+BACKENDS = ('lightgbm', 'numpy')
+
+def load_risk_buckets(path=BUCKETS_PATH) -> pd.DataFrame:
+    buckets = pd.read_csv(path)
+    buckets = buckets.sort_values('limite_superior').reset_index(drop=True)
+    contiguos = np.allclose(buckets['limite_inferior'].values[1:], buckets['limite_superior'].values[:-1])
+    if not contiguos:
+        raise ValueError(f"Los grupos de riesgo en {path} no son contiguos")
+    return buckets
+
+
 class RiskPredictor:
-    def __init__(self, model_path, preprocessor, feature_file=None):
+    def __init__(self, model_path, preprocessor=None, feature_file=None, preprocessor_path=PREPROCESSOR_PATH,
+                 buckets_path=BUCKETS_PATH, cache=None, monitor=None, backend='lightgbm'):
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend de inferencia desconocido: {backend} (opciones: {', '.join(BACKENDS)})")
         self.model_path = model_path
-        self.preprocessor = preprocessor  
+        self.backend = backend
+        self.preprocessor = preprocessor if preprocessor is not None else ModelPreprocessor.load(preprocessor_path)
         self.model = self._load_model()
         self.feature_file = feature_file
+        self.buckets = load_risk_buckets(buckets_path)
+        self.n_threads = 0
+        self.cache = cache
+        self.monitor = monitor
+        self._fuentes = None
+        if self.cache is not None:
+            self._preprocessor_hash = joblib.hash(self.preprocessor.get_state())
+            self.cache.set_version(self.version)
 
     def _load_model(self):
-        return joblib.load(self.model_path)
-
-    def _asignar_grupo(self, prob):
-        if 0 <= prob <= 0.01:
-            return 't1'
-        elif 0.01 < prob <= 0.015:
-            return 't2'
-        elif 0.015 < prob <= 0.03:
-            return 't3'
-        elif 0.03 < prob <= 0.045:
-            return 't4'
-        elif 0.045 < prob <= 0.08:
-            return 't5'
-        elif 0.08 < prob <= 0.15:
-            return 't6'
-        elif 0.15 < prob <= 0.30:
-            return 't7'
-        elif 0.30 < prob <= 1.0:
-            return 't8'
+        self._model_stamp = self._stamp()
+        if str(self.model_path).endswith('.txt'):
+            # Formato nativo de LightGBM: no depende de pickle ni de la versión de sklearn
+            import lightgbm as lgb
+            model = lgb.Booster(model_file=self.model_path)
         else:
-            return 'fuera_rango'
+            model = joblib.load(self.model_path)
+        self.forest = FlatForest.from_booster(model) if self.backend == 'numpy' else None
+        self._explainer = None
+        return model
 
-    def predict(self, input_path):
-        df = pd.read_csv(input_path, sep='|', encoding='utf-8')
+    def _stamp(self):
+        stat = os.stat(self.model_path)
+        return stat.st_mtime_ns, stat.st_size
 
-        X, _ = self.preprocessor.transform(df)
+    @property
+    def version(self) -> str:
+        firma = f"{self._model_stamp}|{getattr(self, '_preprocessor_hash', '')}"
+        return hashlib.md5(firma.encode('utf-8')).hexdigest()
 
-        y_proba = self.model.predict_proba(X)[:, 1]
+    def _refresh_model(self):
+        # Si model.pkl cambió en disco se recarga y se invalida la caché de resultados
+        if self._stamp() != self._model_stamp:
+            logger.info("model.pkl cambió en disco: recargando modelo e invalidando caché")
+            self.model = self._load_model()
+            if self.cache is not None:
+                self.cache.set_version(self.version)
 
-        df_result = pd.DataFrame({
-            'num_doc': df.loc[X.index, 'num_doc'].values,
-            'probabilidad': y_proba
-        })
-        df_result['grupo_riesgo'] = df_result['probabilidad'].apply(self._asignar_grupo)
+    def asignar_grupos(self, probs) -> pd.Categorical:
+        # Intervalos (limite_inferior, limite_superior]; el primero incluye su límite inferior
+        probs = np.asarray(probs, dtype=float)
+        grupos = self.buckets['grupo'].tolist()
+        limites = self.buckets['limite_superior'].values
+        codes = np.searchsorted(limites, probs, side='left')
+        fuera = ~((probs >= self.buckets['limite_inferior'].iat[0]) & (probs <= limites[-1]))
+        codes[fuera] = len(grupos)
+
+        # El conteo no se guarda en la instancia: el predictor se comparte entre hilos
+        n_fuera = int(fuera.sum())
+        if n_fuera:
+            logger.warning("%d probabilidades fuera de rango de los grupos de riesgo", n_fuera)
+        return pd.Categorical.from_codes(codes, categories=grupos + [FUERA_RANGO])
+
+    def _predict_array(self, X, num_threads=None):
+        with stage('prediccion'):
+            return self._predict_model(X, num_threads)
+
+    def _predict_model(self, X, num_threads=None):
+        # El booster nativo evita la validación de DataFrames del wrapper de sklearn
+        if isinstance(X, pd.DataFrame):
+            X = X.to_numpy()
+        if self.forest is not None:
+            return self.forest.predict(X)
+        num_threads = self.n_threads if num_threads is None else num_threads
+        if not hasattr(self.model, 'predict_proba'):
+            return self.model.predict(X, num_threads=num_threads)
+        booster = getattr(self.model, 'booster_', None)
+        if booster is not None:
+            return booster.predict(X, num_threads=num_threads)
+        return self.model.predict_proba(X)[:, 1]
+
+    def contribuciones(self, X) -> np.ndarray:
+        # Contribuciones TreeSHAP al puntaje crudo (log-odds): (filas, columnas de salida + valor
+        # esperado). Tablas por patrón del ensamble aplanado cuando los árboles tienen profundidad
+        # <= 3; si no, la salida nativa pred_contrib del booster, en un solo llamado por lote
+        if self._explainer is None:
+            try:
+                forest = self.forest or FlatForest.from_booster(self.model)
+            except (TypeError, ValueError):
+                forest = None
+            self._explainer = forest if forest is not None and forest.tables is not None else False
+        if self._explainer:
+            return self._explainer.predict_contrib(X)
+        booster = getattr(self.model, 'booster_', self.model)
+        if not hasattr(booster, 'dump_model'):
+            raise ValueError(f"Los códigos de razón requieren un modelo LightGBM, no {type(self.model).__name__}")
+        return booster.predict(X, pred_contrib=True, num_threads=self.n_threads)
+
+    @property
+    def fuentes(self) -> tuple:
+        # (variables de buró, matriz indicadora columnas de salida x variables) para agregar dummies
+        if self._fuentes is None:
+            origen = self.preprocessor.output_sources()
+            variables = list(dict.fromkeys(origen))
+            indicadora = np.zeros((len(origen), len(variables)))
+            indicadora[np.arange(len(origen)), [variables.index(v) for v in origen]] = 1.0
+            self._fuentes = (variables, indicadora)
+        return self._fuentes
+
+    def razones(self, X, k) -> tuple:
+        # Códigos de razón: las k variables de buró que más suben el puntaje de cada fila, de
+        # mayor a menor aporte (log-odds). (códigos en self.fuentes[0], aportes), ambos (filas, k)
+        variables, indicadora = self.fuentes
+        aportes = np.asarray(self.contribuciones(X))[:, :-1] @ indicadora
+        k = min(k, len(variables))
+        top = np.argpartition(-aportes, k - 1, axis=1)[:, :k]
+        valores = np.take_along_axis(aportes, top, axis=1)
+        orden = np.argsort(-valores, axis=1, kind='stable')
+        return np.take_along_axis(top, orden, axis=1), np.take_along_axis(valores, orden, axis=1)
+
+    def _razones_filas(self, X, grupos, k, grupos_razones) -> tuple:
+        # Solo se explican las filas de grupos_razones (None: todas); el resto queda con código -1
+        filas = np.arange(len(grupos)) if grupos_razones is None else \
+            np.flatnonzero(np.isin(np.asarray(grupos, dtype=object), list(grupos_razones)))
+        k = min(k, len(self.fuentes[0]))
+        codigos = np.full((len(grupos), k), -1, dtype=np.intp)
+        aportes = np.full((len(grupos), k), np.nan)
+        if len(filas):
+            with stage('razones'):
+                codigos[filas], aportes[filas] = self.razones(X[filas], k)
+        return codigos, aportes
+
+    def score_records(self, records, razones=0, grupos_razones=None) -> list:
+        compiled = self.preprocessor.compiled
+        if compiled is None:
+            raise RuntimeError("score_records requiere un ModelPreprocessor ajustado y con limpieza")
+        with stage('transformacion'):
+            X = compiled.transform_records(records)
+        y_proba = self._predict_array(X, num_threads=1)
+        with stage('grupos'):
+            grupos = self.asignar_grupos(y_proba)
+        if self.monitor is not None:
+            with stage('monitoreo'):
+                self.monitor.update_records(records, grupos)
+        puntajes = [
+            {'num_doc': rec.get('num_doc'), 'probabilidad': float(prob), 'grupo_riesgo': grupo}
+            for rec, prob, grupo in zip(records, y_proba, grupos)
+        ]
+        if razones:
+            variables = self.fuentes[0]
+            codigos, aportes = self._razones_filas(X, grupos, razones, grupos_razones)
+            for puntaje, fila_codigos, fila_aportes in zip(puntajes, codigos, aportes):
+                puntaje['razones'] = [{'variable': variables[c], 'aporte': float(a)}
+                                      for c, a in zip(fila_codigos, fila_aportes) if c >= 0] or None
+        return puntajes
+
+    def predict(self, input_path, razones=0, grupos_razones=None):
+        with stage('lectura'):
+            df = read_raw(input_path)
+        return self.predict_from_dataframe(df, razones, grupos_razones)
 
-        assert df_result['grupo_riesgo'].isin([
-            't1', 't2', 't3', 't4', 't5', 't6', 't7', 't8'
-        ]).all(), "❌ Hay categorías fuera de rango"
+    def predict_stream(self, input_path, output_path, block_size=BLOCK_SIZE, razones=0, grupos_razones=None):
+        # Memoria acotada por el tamaño del bloque: cada bloque se limpia, transforma,
+        # puntúa y se escribe al destino antes de leer el siguiente. (filas, fuera de rango)
+        sink = ResultSink(output_path)
+        chunks = iter_raw(input_path, block_size=block_size)
+        total_rows, fuera_rango = 0, 0
+        try:
+            while True:
+                with stage('lectura'):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                df_result = self.predict_from_dataframe(chunk, razones, grupos_razones)
+                with stage('serializacion'):
+                    sink.write(df_result)
+                total_rows += len(df_result)
+                fuera_rango += contar_fuera_rango(df_result)
+        finally:
+            sink.close()
+        return total_rows, fuera_rango
 
+    def predict_from_dataframe(self, df, razones=0, grupos_razones=None):
+        # razones: k códigos de razón por fila (columnas razon_i / aporte_i); grupos_razones
+        # limita la explicación a esos grupos de riesgo (p. ej. t6-t8) y acota su costo
+        if self.cache is not None and not razones:
+            df_result = self._predict_cached(df)
+        else:
+            X, _, filas = self.preprocessor.transform_array(df, return_index=True)
+            if filas is not df.index:
+                # Ajuste sobre el lote (preprocesador sin estado): solo las filas que sobreviven
+                df = df.loc[filas]
+            y_proba = self._predict_array(X)
+            df_result = self._build_result(df['num_doc'].values, y_proba)
+            if razones:
+                self._agregar_razones(df_result, X, razones, grupos_razones)
+
+        if self.monitor is not None:
+            with stage('monitoreo'):
+                self.monitor.update(df, df_result['grupo_riesgo'].values)
         return df_result
 
-    def predict_from_dataframe(self, df):
-        X, _ = self.preprocessor.transform(df)
-        y_proba = self.model.predict_proba(X)[:, 1]
+    def _predict_cached(self, df):
+        self._refresh_model()
+        feature_cols = self.preprocessor.num_cols + self.preprocessor.cat_cols
+        keys = self.cache.keys_for(df[feature_cols], self.version)
+        y_proba, found = self.cache.get_many(keys)
+
+        if not found.all():
+            # Solo los fallos (sin repetir huellas) pasan por el modelo, en un único llamado
+            miss_keys, first, inverse = np.unique(keys[~found], return_index=True, return_inverse=True)
+            miss_rows = np.flatnonzero(~found)[first]
+            X, _ = self.preprocessor.transform_array(df.iloc[miss_rows])
+            miss_proba = self._predict_array(X)
+            y_proba[~found] = miss_proba[inverse]
+            self.cache.put_many(miss_keys, miss_proba, self.version)
+
+        return self._build_result(df['num_doc'].values, y_proba)
+
+    def _agregar_razones(self, df_result, X, razones, grupos_razones):
+        # Categorías fijas (todas las variables): el esquema no cambia entre bloques del stream
+        variables = self.fuentes[0]
+        codigos, aportes = self._razones_filas(X, df_result['grupo_riesgo'].values, razones, grupos_razones)
+        for j in range(codigos.shape[1]):
+            df_result[f'razon_{j + 1}'] = pd.Categorical.from_codes(codigos[:, j], categories=variables)
+            df_result[f'aporte_{j + 1}'] = aportes[:, j]
 
+    def _build_result(self, num_doc, y_proba):
         df_result = pd.DataFrame({
-            'num_doc': df.loc[X.index, 'num_doc'].values,
+            'num_doc': num_doc,
             'probabilidad': y_proba
         })
-        df_result['grupo_riesgo'] = df_result['probabilidad'].apply(self._asignar_grupo)
+        with stage('grupos'):
+            df_result['grupo_riesgo'] = self.asignar_grupos(df_result['probabilidad'].values)
+        return df_result
+
+
+def contar_fuera_rango(df_result: pd.DataFrame) -> int:
+    return int((df_result['grupo_riesgo'] == FUERA_RANGO).sum())
+
+
+class ResultSink:
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.is_parquet = str(output_path).endswith('.parquet')
+        self._writer = None
+        self._header = True
+
+    def write(self, df_result: pd.DataFrame):
+        if self.is_parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(df_result, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.output_path, table.schema)
+            self._writer.write_table(table)
+        else:
+            df_result.to_csv(self.output_path, mode='w' if self._header else 'a',
+                             header=self._header, index=False)
+            self._header = False
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    import contextlib
+
+    from config import MODEL_PATH
+    from metrics import profiled
 
-        assert df_result['grupo_riesgo'].isin([
-            't1','t2','t3','t4','t5','t6','t7','t8'
-        ]).all(), "❌ Categorías fuera de rango"
+    parser = argparse.ArgumentParser(description="Puntúa un archivo separado por '|' por bloques")
+    parser.add_argument('input_path')
+    parser.add_argument('output_path', help="Destino .csv o .parquet")
+    parser.add_argument('--block-mb', type=int, default=BLOCK_SIZE // 1024 ** 2)
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--backend', choices=BACKENDS, default='lightgbm')
+    parser.add_argument('--razones', type=int, default=0, metavar='K', help="Códigos de razón por cliente")
+    parser.add_argument('--razones-grupos', nargs='+', default=None, metavar='GRUPO',
+                        help="Explica solo estos grupos de riesgo (p. ej. t6 t7 t8)")
+    parser.add_argument('--profile', default=None, metavar='SALIDA.prof', help="Perfil cProfile del lote")
+    args = parser.parse_args()
 
-        return df_result
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    predictor = RiskPredictor(args.model, backend=args.backend)
+    timer = StageTimer('batch')
+    with timer.activo(), (profiled(args.profile) if args.profile else contextlib.nullcontext()):
+        n, fuera_rango = predictor.predict_stream(args.input_path, args.output_path,
+                                                  block_size=args.block_mb * 1024 ** 2, razones=args.razones,
+                                                  grupos_razones=args.razones_grupos)
+    timer.add_rows(n)
+    timer.finish()
+    print(f"{n} registros puntuados en {args.output_path} ({fuera_rango} fuera de rango)")
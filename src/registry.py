@@ -0,0 +1,306 @@
+import json
+import logging
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from config import REGISTRY_PATH
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILES = ('model.txt', 'model.pkl')
+ALIASES = ('champion', 'challenger')
+
+
+class ModelRegistry:
+    # Registro local: cada versión es un directorio inmutable <root>/vNNNN con el modelo
+    # (model.txt o model.pkl), preprocessor.pkl, risk_buckets.csv opcional y metadata.json.
+    # Los alias (champion, challenger) son archivos JSON que se reemplazan con os.replace:
+    # quien los lee ve la versión anterior o la nueva, nunca un estado intermedio.
+    def __init__(self, root=REGISTRY_PATH):
+        self.root = root
+
+    def versions(self) -> list:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(nombre for nombre in os.listdir(self.root)
+                      if os.path.exists(os.path.join(self.root, nombre, 'metadata.json')))
+
+    def _next_version(self) -> str:
+        numeros = [int(nombre[1:]) for nombre in os.listdir(self.root)
+                   if nombre.startswith('v') and nombre[1:].isdigit()]
+        return f"v{max(numeros, default=0) + 1:04d}"
+
+    def register(self, model_path, preprocessor_path, buckets_path=None, metadata=None) -> str:
+        model_file = 'model.txt' if str(model_path).endswith('.txt') else 'model.pkl'
+        os.makedirs(self.root, exist_ok=True)
+        # Se arma en un directorio temporal y se publica con un rename atómico
+        tmp = tempfile.mkdtemp(prefix='.tmp-', dir=self.root)
+        try:
+            shutil.copy2(model_path, os.path.join(tmp, model_file))
+            shutil.copy2(preprocessor_path, os.path.join(tmp, 'preprocessor.pkl'))
+            if buckets_path:
+                shutil.copy2(buckets_path, os.path.join(tmp, 'risk_buckets.csv'))
+            while True:
+                version = self._next_version()
+                with open(os.path.join(tmp, 'metadata.json'), 'w', encoding='utf-8') as f:
+                    json.dump({'version': version, 'creado': datetime.now().isoformat(timespec='seconds'),
+                               'origen': os.path.abspath(model_path), **(metadata or {})}, f, indent=2)
+                try:
+                    os.rename(tmp, os.path.join(self.root, version))
+                    return version
+                except OSError:
+                    # Otro proceso publicó la misma versión: se intenta con la siguiente
+                    if not os.path.isdir(os.path.join(self.root, version)):
+                        raise
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+    def paths(self, version) -> dict:
+        directorio = os.path.join(self.root, version)
+        if not os.path.exists(os.path.join(directorio, 'metadata.json')):
+            raise KeyError(f"La versión {version} no existe en {self.root}")
+        model = next(os.path.join(directorio, nombre) for nombre in MODEL_FILES
+                     if os.path.exists(os.path.join(directorio, nombre)))
+        buckets = os.path.join(directorio, 'risk_buckets.csv')
+        return {
+            'model': model,
+            'preprocessor': os.path.join(directorio, 'preprocessor.pkl'),
+            'buckets': buckets if os.path.exists(buckets) else None,
+        }
+
+    def metadata(self, version) -> dict:
+        self.paths(version)
+        with open(os.path.join(self.root, version, 'metadata.json'), encoding='utf-8') as f:
+            return json.load(f)
+
+    def _alias_path(self, alias) -> str:
+        if alias not in ALIASES:
+            raise ValueError(f"Alias desconocido: {alias} (opciones: {', '.join(ALIASES)})")
+        return os.path.join(self.root, f'{alias}.json')
+
+    def set_alias(self, alias, version, **opciones):
+        self.paths(version)
+        path = self._alias_path(alias)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': version, 'actualizado': datetime.now().isoformat(timespec='seconds'),
+                       **opciones}, f)
+        os.replace(tmp, path)
+
+    def clear_alias(self, alias):
+        try:
+            os.remove(self._alias_path(alias))
+        except FileNotFoundError:
+            pass
+
+    def alias(self, alias) -> dict:
+        # {'version': ..., 'actualizado': ..., opciones} o None si el alias no está asignado
+        try:
+            with open(self._alias_path(alias), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def stamp(self) -> tuple:
+        # Firma barata de los alias (un stat por alias) para detectar cambios por sondeo
+        firma = []
+        for alias in ALIASES:
+            try:
+                stat = os.stat(self._alias_path(alias))
+                firma.append((stat.st_mtime_ns, stat.st_size, stat.st_ino))
+            except FileNotFoundError:
+                firma.append(None)
+        return tuple(firma)
+
+    def load(self, version, **kwargs):
+        # RiskPredictor con el modelo, el preprocesamiento y los grupos de la versión
+        from config import BUCKETS_PATH
+        from data_preprocesing import ModelPreprocessor
+        from predict import RiskPredictor
+
+        paths = self.paths(version)
+        return RiskPredictor(paths['model'], preprocessor=ModelPreprocessor.load(paths['preprocessor']),
+                             buckets_path=paths['buckets'] or BUCKETS_PATH, **kwargs)
+
+
+class ShadowScorer:
+    # Puntúa en un hilo de fondo una fracción de las filas con el modelo retador y acumula su
+    # desacuerdo con el campeón (PD y grupo de riesgo). submit() solo muestrea y encola sin
+    # bloquear: si la cola está llena la muestra se descarta y se cuenta, así la latencia del
+    # campeón no depende del retador.
+    def __init__(self, predictor, version, grupos, sample_rate=0.1, max_queue=64, seed=None):
+        self.predictor = predictor
+        self.version = version
+        self.grupos = list(grupos)
+        self.sample_rate = sample_rate
+        self._rng = np.random.default_rng(seed)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self.reset()
+        self._thread = threading.Thread(target=self._run, name=f'shadow-{version}', daemon=True)
+        self._thread.start()
+
+    def reset(self):
+        with self._lock:
+            self.n = 0
+            self.descartados = 0
+            self.errores = 0
+            self._suma_dif = 0.0
+            self._suma_abs = 0.0
+            self._suma_cuadrados = 0.0
+            self._max_abs = 0.0
+            self._segundos = 0.0
+            self._matriz = np.zeros((len(self.grupos), len(self.grupos)), dtype=np.int64)
+
+    def _sample(self, n) -> np.ndarray:
+        with self._lock:
+            return np.flatnonzero(self._rng.random(n) < self.sample_rate)
+
+    def _put(self, item, n):
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.descartados += n
+
+    def submit(self, df: pd.DataFrame, resultado: pd.DataFrame):
+        # resultado: salida del campeón para df, fila a fila en el mismo orden
+        filas = self._sample(len(df))
+        if len(filas):
+            self._put(('frame', df.iloc[filas].copy(), resultado['probabilidad'].to_numpy()[filas],
+                       np.asarray(resultado['grupo_riesgo'])[filas]), len(filas))
+
+    def submit_records(self, records, puntajes):
+        filas = self._sample(len(records))
+        if len(filas):
+            self._put(('records', [records[i] for i in filas],
+                       np.array([puntajes[i]['probabilidad'] for i in filas]),
+                       np.array([puntajes[i]['grupo_riesgo'] for i in filas])), len(filas))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            tipo, datos, pd_campeon, grupo_campeon = item
+            try:
+                t0 = time.perf_counter()
+                if tipo == 'frame':
+                    resultado = self.predictor.predict_from_dataframe(datos)
+                    pd_retador = resultado['probabilidad'].to_numpy()
+                    grupo_retador = np.asarray(resultado['grupo_riesgo'])
+                else:
+                    puntajes = self.predictor.score_records(datos)
+                    pd_retador = np.array([p['probabilidad'] for p in puntajes])
+                    grupo_retador = np.array([p['grupo_riesgo'] for p in puntajes])
+                self._accumulate(pd_campeon, grupo_campeon, pd_retador, grupo_retador, time.perf_counter() - t0)
+            except Exception:
+                logger.exception("Error puntuando con el retador %s", self.version)
+                with self._lock:
+                    self.errores += len(pd_campeon)
+
+    def _accumulate(self, pd_campeon, grupo_campeon, pd_retador, grupo_retador, segundos):
+        dif = pd_retador - pd_campeon
+        c_campeon = pd.Categorical(grupo_campeon, categories=self.grupos).codes
+        c_retador = pd.Categorical(grupo_retador, categories=self.grupos).codes
+        validos = (c_campeon >= 0) & (c_retador >= 0)
+        with self._lock:
+            self.n += len(dif)
+            self._suma_dif += float(dif.sum())
+            self._suma_abs += float(np.abs(dif).sum())
+            self._suma_cuadrados += float((dif ** 2).sum())
+            self._max_abs = max(self._max_abs, float(np.abs(dif).max()))
+            self._segundos += segundos
+            np.add.at(self._matriz, (c_campeon[validos], c_retador[validos]), 1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            n = self.n
+            matriz = self._matriz.copy()
+            base = {'version_retador': self.version, 'tasa_muestreo': self.sample_rate, 'n': n,
+                    'descartados': self.descartados, 'errores': self.errores, 'pendientes': self._queue.qsize()}
+            if not n:
+                return base
+            base.update({
+                'pd_diferencia_media': self._suma_dif / n,
+                'pd_diferencia_abs_media': self._suma_abs / n,
+                'pd_diferencia_abs_max': self._max_abs,
+                'pd_rmse': (self._suma_cuadrados / n) ** 0.5,
+                'latencia_retador_ms_por_fila': 1000 * self._segundos / n,
+            })
+        base['acuerdo_grupos'] = float(np.trace(matriz) / max(matriz.sum(), 1))
+        # Filas: grupo del campeón; columnas: grupo del retador (solo celdas con conteo)
+        base['matriz_grupos'] = {
+            campeon: {retador: int(matriz[i, j]) for j, retador in enumerate(self.grupos) if matriz[i, j]}
+            for i, campeon in enumerate(self.grupos) if matriz[i].any()
+        }
+        return base
+
+    def close(self, timeout=None):
+        # Termina después de procesar lo ya encolado
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from config import BUCKETS_PATH, PREPROCESSOR_PATH
+
+    parser = argparse.ArgumentParser(description="Registro local de versiones del modelo")
+    parser.add_argument('--registry', default=REGISTRY_PATH)
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+    register = subparsers.add_parser('register', help="Registra un modelo y su preprocesamiento como nueva versión")
+    register.add_argument('--model', default=None, help="Por defecto model.txt exportado de models/model.pkl")
+    register.add_argument('--preprocessor', default=PREPROCESSOR_PATH)
+    register.add_argument('--buckets', default=BUCKETS_PATH)
+    register.add_argument('--run-id', default=None, help="Run de MLflow de donde sale el modelo")
+    register.add_argument('--nota', default=None)
+    register.add_argument('--promote', action='store_true', help="Asigna la versión como champion")
+    subparsers.add_parser('list', help="Lista las versiones y los alias")
+    promote = subparsers.add_parser('promote', help="Asigna el champion (los servicios lo recargan en caliente)")
+    promote.add_argument('version')
+    shadow = subparsers.add_parser('shadow', help="Asigna o quita el challenger de la puntuación en sombra")
+    shadow.add_argument('version', nargs='?')
+    shadow.add_argument('--tasa', type=float, default=None, help="Fracción de filas puntuadas en sombra")
+    shadow.add_argument('--off', action='store_true')
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.registry)
+    if args.comando == 'register':
+        metadata = {k: v for k, v in (('mlflow_run_id', args.run_id), ('nota', args.nota)) if v}
+        if args.model is None:
+            from export_model import native_model
+
+            args.model = native_model()
+        version = registry.register(args.model, args.preprocessor, args.buckets, metadata)
+        if args.promote:
+            registry.set_alias('champion', version)
+        print(f"Versión {version} registrada en {registry.root}")
+    elif args.comando == 'list':
+        aliases = {alias: (registry.alias(alias) or {}).get('version') for alias in ALIASES}
+        for version in registry.versions():
+            marcas = ', '.join(alias for alias, v in aliases.items() if v == version)
+            meta = registry.metadata(version)
+            print(f"{version}  {meta['creado']}  {meta.get('nota', '')}  {f'[{marcas}]' if marcas else ''}")
+    elif args.comando == 'promote':
+        registry.set_alias('champion', args.version)
+        print(f"champion -> {args.version}")
+    elif args.off:
+        registry.clear_alias('challenger')
+        print("Puntuación en sombra desactivada")
+    else:
+        if not args.version:
+            parser.error("shadow requiere una versión o --off")
+        opciones = {'tasa_muestreo': args.tasa} if args.tasa is not None else {}
+        registry.set_alias('challenger', args.version, **opciones)
+        print(f"challenger -> {args.version}")
@@ -0,0 +1,303 @@
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import joblib
+from joblib import Parallel, delayed
+
+from sklearn.base import clone
+from sklearn.model_selection import ParameterGrid, StratifiedKFold, train_test_split
+from sklearn.metrics import f1_score, precision_score, recall_score, roc_auc_score
+from sklearn.linear_model import LogisticRegression
+from sklearn.ensemble import RandomForestClassifier
+from lightgbm import LGBMClassifier
+
+from config import BASE_DIR
+from data_preprocesing import ModelPreprocessor, load_selected_features
+from schema import read_raw
+
+CACHE_DIR = os.path.join(BASE_DIR, 'models', 'cache')
+STUDIES_DIR = os.path.join(BASE_DIR, 'models', 'studies')
+TEST_SIZE = 0.2
+SPLIT_SEED = 42
+MLFLOW_URI = os.environ.get('MLFLOW_TRACKING_URI', 'sqlite:///' + os.path.join(BASE_DIR, 'mlflow.db'))
+
+
+def model_spaces(scale_pos):
+    # Mismas grillas de 004_model_selection.ipynb
+    spaces = {
+        'LogisticRegression_HPO': (LogisticRegression(max_iter=500, random_state=42), {
+            'C': [0.01, 0.1, 0.5, 1],
+            'penalty': ['l2'],
+            'solver': ['lbfgs', 'liblinear'],
+            'class_weight': ['balanced']
+        }),
+        'RandomForest_HPO': (RandomForestClassifier(random_state=42), {
+            'n_estimators': [200, 300, 500],
+            'max_depth': [10, 20, 40],
+            'min_samples_split': [2, 5],
+            'min_samples_leaf': [1, 2],
+            'max_features': ['sqrt', 'log2'],
+            'class_weight': ['balanced']
+        }),
+        'LightGBM_HPO': (LGBMClassifier(random_state=42, verbose=-1), {
+            'n_estimators': [200, 400],
+            'max_depth': [10, 20, -1],
+            'learning_rate': [0.01, 0.05],
+            'num_leaves': [31, 50],
+            'min_data_in_leaf': [20, 40],
+            'class_weight': ['balanced']
+        }),
+        'XGBoost_Optimized': (LGBMClassifier(random_state=42, verbose=-1), {
+            'n_estimators': [200, 400, 600],
+            'max_features': ['sqrt', 'log2'],
+            'max_depth': [3, 6, 10, 20],
+            'learning_rate': [0.01, 0.05, 0.1, 0.001],
+            'scale_pos_weight': [scale_pos, scale_pos * 1.5]
+        }),
+    }
+    try:
+        from xgboost import XGBClassifier
+    except ImportError:
+        return spaces
+    spaces['XGBoost_HPO'] = (XGBClassifier(random_state=42, eval_metric='logloss'), {
+        'n_estimators': [200, 400],
+        'max_depth': [3, 6, 10],
+        'learning_rate': [0.01, 0.05, 0.1],
+        'scale_pos_weight': [scale_pos, scale_pos * 1.5]
+    })
+    return spaces
+
+
+def matrices_key(train_path, preprocessor) -> str:
+    # Huella de las matrices: archivo de entrenamiento, variables seleccionadas, configuración
+    # del preprocesamiento y partición train/test
+    stat = os.stat(train_path)
+    firma = '|'.join([
+        f"{os.path.abspath(train_path)}|{stat.st_mtime_ns}|{stat.st_size}",
+        ','.join(load_selected_features()),
+        f"{preprocessor.target_column}|{preprocessor.apply_cleaning}|{preprocessor.balanceo}",
+        f"{TEST_SIZE}|{SPLIT_SEED}",
+    ])
+    return hashlib.md5(firma.encode()).hexdigest()[:16]
+
+
+def prepare_matrices(train_path, cache_dir=CACHE_DIR):
+    # El preprocesamiento se ajusta una sola vez por archivo de entrenamiento y se reutiliza
+    preprocessor = ModelPreprocessor()
+    key = matrices_key(train_path, preprocessor)
+    cache_path = os.path.join(cache_dir, f"matrices_{key}.joblib")
+    if os.path.exists(cache_path):
+        return joblib.load(cache_path)
+
+    X, y = preprocessor.fit_transform(read_raw(train_path))
+    X = X.astype(np.float32)
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=TEST_SIZE, stratify=y, random_state=SPLIT_SEED
+    )
+    matrices = {
+        'X_train': X_train, 'X_test': X_test, 'y_train': y_train, 'y_test': y_test,
+        'preprocessor_state': preprocessor.get_state(), 'huella': key,
+    }
+    os.makedirs(cache_dir, exist_ok=True)
+    joblib.dump(matrices, cache_path)
+    return matrices
+
+
+def _params_key(params):
+    return json.dumps(params, sort_keys=True, default=float)
+
+
+def _evaluate(estimator, params, X, y, n_samples, cv, seed):
+    # Puntaje F1 promedio de validación cruzada sobre una submuestra estratificada de n_samples filas
+    if n_samples < len(y):
+        X, _, y, _ = train_test_split(X, y, train_size=n_samples, stratify=y, random_state=seed)
+    folds = StratifiedKFold(n_splits=cv, shuffle=True, random_state=seed)
+    scores = []
+    for train_idx, val_idx in folds.split(X, y):
+        model = clone(estimator).set_params(**params)
+        model.fit(X.iloc[train_idx], y.iloc[train_idx])
+        scores.append(f1_score(y.iloc[val_idx], model.predict(X.iloc[val_idx])))
+    return {'params': params, 'n_samples': int(n_samples), 'score': float(np.mean(scores))}
+
+
+class HalvingStudy:
+    # Búsqueda por halving sucesivo: todos los candidatos se evalúan con pocos datos y en cada
+    # ronda solo el mejor 1/factor pasa a la siguiente con factor veces más filas.
+    # Cada evaluación se agrega a un archivo JSONL, de modo que un estudio interrumpido
+    # se reanuda sin repetir las evaluaciones ya terminadas. Cada registro lleva la huella de
+    # los datos (matrices_key), cv y seed: al reanudar solo se reutilizan los de la misma huella.
+    def __init__(self, name, studies_dir=STUDIES_DIR, factor=3, min_samples=500, cv=3, n_jobs=-1, seed=42,
+                 aggressive=False, fingerprint=''):
+        self.name = name
+        self.fingerprint = hashlib.md5(f"{fingerprint}|{cv}|{seed}".encode()).hexdigest()[:16]
+        self.path = os.path.join(studies_dir, f"{name}.jsonl")
+        self.factor = factor
+        self.min_samples = min_samples
+        self.cv = cv
+        self.n_jobs = n_jobs
+        self.seed = seed
+        self.aggressive = aggressive
+        os.makedirs(studies_dir, exist_ok=True)
+        self.records = self._load()
+
+    def _load(self):
+        records, descartados = {}, 0
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # última línea truncada por una interrupción
+                    if rec.get('huella') != self.fingerprint:
+                        descartados += 1
+                        continue
+                    records[(rec['model'], _params_key(rec['params']), rec['n_samples'])] = rec
+        if descartados:
+            print(f"⚠️ {descartados} evaluaciones de '{self.name}' son de otros datos, variables, cv o "
+                  f"semilla: se ignoran y se vuelven a evaluar")
+        return records
+
+    def _append(self, rec):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(rec, default=float) + '\n')
+        self.records[(rec['model'], _params_key(rec['params']), rec['n_samples'])] = rec
+
+    def _schedule(self, n_candidates, n_total):
+        # Las rondas que repiten el mismo número de filas solo vuelven a cortar sobre puntajes
+        # ya calculados. Con aggressive=True la última ronda usa todo el conjunto y el recorte
+        # extra ocurre en min_samples; si no, los candidatos sobrantes se desempatan con todo el conjunto.
+        n_rounds = max(1, int(np.ceil(np.log(max(n_candidates, 1)) / np.log(self.factor))) + 1)
+        if self.aggressive:
+            return [min(n_total, max(self.min_samples, int(n_total / self.factor ** (n_rounds - 1 - r))))
+                    for r in range(n_rounds)]
+        first = max(self.min_samples, int(n_total / self.factor ** (n_rounds - 1)))
+        return [min(n_total, first * self.factor ** r) for r in range(n_rounds)]
+
+    def run(self, model_name, estimator, param_grid, X, y):
+        candidates = list(ParameterGrid(param_grid))
+        if self.n_jobs != 1 and 'n_jobs' in estimator.get_params():
+            # El paralelismo va entre candidatos: cada proceso entrena con un solo hilo
+            estimator = clone(estimator).set_params(n_jobs=1)
+        history = {}
+        for n_samples in self._schedule(len(candidates), len(y)):
+            pending = [p for p in candidates
+                       if (model_name, _params_key(p), n_samples) not in self.records]
+            results = Parallel(n_jobs=self.n_jobs, return_as='generator_unordered')(
+                delayed(_evaluate)(estimator, p, X, y, n_samples, self.cv, self.seed) for p in pending
+            )
+            for rec in results:
+                rec['model'] = model_name
+                rec['huella'] = self.fingerprint
+                self._append(rec)
+
+            keys = [(model_name, _params_key(p), n_samples) for p in candidates]
+            history.update((key, self.records[key]) for key in keys)
+            rung = sorted((self.records[key] for key in keys), key=lambda r: r['score'], reverse=True)
+            n_keep = max(1, len(candidates) // self.factor)
+            candidates = [r['params'] for r in rung[:n_keep]]
+        return rung[0], list(history.values())
+
+
+def log_to_mlflow(experiment, model_name, best, history, metrics, tracking_uri=MLFLOW_URI):
+    import mlflow
+    from mlflow.entities import Metric, Param
+    from mlflow.tracking import MlflowClient
+
+    mlflow.set_tracking_uri(tracking_uri)
+    client = MlflowClient()
+    experiment_obj = client.get_experiment_by_name(experiment)
+    experiment_id = experiment_obj.experiment_id if experiment_obj else client.create_experiment(experiment)
+
+    run = client.create_run(experiment_id, run_name=model_name)
+    timestamp = int(time.time() * 1000)
+    # Un solo llamado por run: parámetros del mejor candidato, métricas finales e historial por ronda
+    params = [Param(k, str(v)) for k, v in best['params'].items()]
+    metric_list = [Metric(k, float(v), timestamp, 0) for k, v in metrics.items()]
+    metric_list += [Metric('cv_f1_halving', rec['score'], timestamp, step)
+                    for step, rec in enumerate(history)]
+    client.log_batch(run.info.run_id, metrics=metric_list, params=params)
+    client.set_terminated(run.info.run_id)
+    return run.info.run_id
+
+
+def train(train_path, study_name, models=None, factor=3, min_samples=500, n_jobs=-1, aggressive=False,
+          experiment='default_train_selected_features_optimo', use_mlflow=True, output_path=None,
+          preprocessor_path=None, register=False):
+    # output_path: el mejor modelo se guarda junto al preprocesamiento ajustado en la misma
+    # partición (por defecto preprocessor.pkl en el mismo directorio); register=True además
+    # publica ambos como una nueva versión del registro
+    matrices = prepare_matrices(train_path)
+    X_train, X_test = matrices['X_train'], matrices['X_test']
+    y_train, y_test = matrices['y_train'], matrices['y_test']
+    scale_pos = (y_train == 0).sum() / (y_train == 1).sum()
+
+    spaces = model_spaces(scale_pos)
+    study = HalvingStudy(study_name, factor=factor, min_samples=min_samples, n_jobs=n_jobs, aggressive=aggressive,
+                         fingerprint=matrices['huella'])
+    summary = []
+    best_overall = None
+    for model_name in models or list(spaces):
+        estimator, param_grid = spaces[model_name]
+        best, history = study.run(model_name, estimator, param_grid, X_train, y_train)
+
+        model = clone(estimator).set_params(**best['params']).fit(X_train, y_train)
+        y_pred = model.predict(X_test)
+        y_proba = model.predict_proba(X_test)[:, 1]
+        metrics = {
+            'f1_score': f1_score(y_test, y_pred),
+            'precision': precision_score(y_test, y_pred),
+            'recall': recall_score(y_test, y_pred),
+            'roc_auc': roc_auc_score(y_test, y_proba),
+        }
+        if use_mlflow:
+            log_to_mlflow(experiment, model_name, best, history, metrics)
+        summary.append({'modelo': model_name, 'cv_f1': best['score'], **metrics})
+        print(f"✅ {model_name} -> F1: {metrics['f1_score']:.4f}, AUC: {metrics['roc_auc']:.4f} "
+              f"({len(history)} evaluaciones)")
+
+        if best_overall is None or best['score'] > best_overall[0]:
+            best_overall = (best['score'], model)
+
+    if output_path:
+        preprocessor_path = preprocessor_path or os.path.join(os.path.dirname(output_path), 'preprocessor.pkl')
+        joblib.dump(best_overall[1], output_path)
+        joblib.dump(matrices['preprocessor_state'], preprocessor_path)
+        print(f"Modelo guardado en {output_path} y preprocesamiento en {preprocessor_path}")
+        if register:
+            from registry import ModelRegistry
+
+            version = ModelRegistry().register(output_path, preprocessor_path,
+                                               metadata={'estudio': study_name, 'cv_f1': best_overall[0]})
+            print(f"Registrado como {version}")
+    return pd.DataFrame(summary).sort_values('cv_f1', ascending=False)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Selección de modelo por halving sucesivo, paralela y reanudable")
+    parser.add_argument('train_path', help="Archivo de entrenamiento separado por '|'")
+    parser.add_argument('--study', default='model_selection', help="Nombre del estudio (permite reanudar)")
+    parser.add_argument('--modelos', nargs='+', default=None)
+    parser.add_argument('--factor', type=int, default=3)
+    parser.add_argument('--min-samples', type=int, default=500)
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--agresivo', action='store_true', help="Eliminación agresiva en la primera ronda")
+    parser.add_argument('--sin-mlflow', action='store_true')
+    parser.add_argument('--output', default=None, help="Ruta para guardar el mejor modelo")
+    parser.add_argument('--output-preprocessor', default=None,
+                        help="Estado de preprocesamiento del entrenamiento (por defecto junto a --output)")
+    parser.add_argument('--registrar', action='store_true', help="Registra modelo y preprocesamiento como nueva versión")
+    args = parser.parse_args()
+    if args.registrar and not args.output:
+        parser.error("--registrar requiere --output")
+
+    resumen = train(args.train_path, args.study, models=args.modelos, factor=args.factor,
+                    min_samples=args.min_samples, n_jobs=args.n_jobs, aggressive=args.agresivo, use_mlflow=not args.sin_mlflow,
+                    output_path=args.output, preprocessor_path=args.output_preprocessor, register=args.registrar)
+    print(resumen.to_string(index=False))
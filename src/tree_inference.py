@@ -0,0 +1,334 @@
+import numpy as np
+
+# Árboles de hasta esta profundidad (<= 7 nodos internos) se evalúan con tabla de decisiones
+TABLE_DEPTH = 3
+# Elementos (nodos x filas) por bloque: acota la memoria temporal y mantiene los bloques en caché
+BLOCK_ELEMENTS = 1 << 20
+# LightGBM trata |x| <= kZeroThreshold como cero en los cortes con missing_type Zero
+ZERO_THRESHOLD = 1e-35
+MISSING_TYPES = {'None': 0, 'Zero': 1, 'NaN': 2}
+
+
+class FlatForest:
+    # Ensamble de LightGBM aplanado en arreglos NumPy (un arreglo por atributo de nodo),
+    # evaluado por bloques de filas con operaciones sobre todos los árboles a la vez.
+    #  - Árboles poco profundos: cada árbol se completa a profundidad 3 en orden de montículo,
+    #    todas sus decisiones salen de una sola comparación y los 7 bits de decisión indexan
+    #    una tabla (árbol, patrón) -> valor de la hoja.
+    #  - Árboles profundos: recorrido nivel a nivel del arreglo de nodos (hojas con bucle propio).
+    def __init__(self, nodes, roots, depth, tables, transform, scale, n_features):
+        self.nodes = nodes
+        self.roots = roots
+        self.depth = depth
+        self.tables = tables
+        self.n_trees = len(roots)
+        self.transform = transform
+        self.scale = scale
+        # Ancho de entrada del modelo, no solo las variables usadas en algún corte
+        self.n_features = n_features
+        self._contrib = None
+        if tables is not None:
+            self._table_offsets = (np.arange(self.n_trees, dtype=np.intp) * tables[1].shape[1])[:, None]
+
+    @classmethod
+    def from_booster(cls, model) -> 'FlatForest':
+        # model: lgb.Booster o LGBMClassifier ajustado
+        booster = getattr(model, 'booster_', model)
+        if not hasattr(booster, 'dump_model'):
+            raise TypeError(f"El backend numpy solo admite modelos LightGBM, no {type(model).__name__}")
+        dump = booster.dump_model()
+        if dump['num_tree_per_iteration'] != 1:
+            raise ValueError("El backend numpy no admite modelos multiclase")
+        transform, scale = _output_transform(dump['objective'])
+        trees = [info['tree_structure'] for info in dump['tree_info']]
+        factor = 1.0 / len(trees) if dump.get('average_output') else 1.0
+
+        columnas = {key: [] for key in ('feature', 'threshold', 'default_left', 'missing_type',
+                                        'left', 'right', 'value', 'count')}
+        roots, depth = [], 0
+        for tree in trees:
+            roots.append(len(columnas['feature']))
+            stack = [(tree, len(columnas['feature']), 0)]
+            _append_node(columnas)
+            while stack:
+                node, index, level = stack.pop()
+                depth = max(depth, level)
+                if 'split_index' not in node:
+                    # Hoja: corte neutro (x <= inf) con ambos hijos apuntando a sí misma
+                    columnas['left'][index] = columnas['right'][index] = index
+                    columnas['value'][index] = node['leaf_value'] * factor
+                    columnas['count'][index] = node.get('leaf_count', 0)
+                    continue
+                if node['decision_type'] != '<=':
+                    raise ValueError("El backend numpy no admite cortes categóricos")
+                left, right = _append_node(columnas), _append_node(columnas)
+                columnas['feature'][index] = node['split_feature']
+                columnas['threshold'][index] = node['threshold']
+                columnas['default_left'][index] = node['default_left']
+                columnas['missing_type'][index] = MISSING_TYPES[node['missing_type']]
+                columnas['left'][index], columnas['right'][index] = left, right
+                columnas['count'][index] = node.get('internal_count', 0)
+                stack += [(node['left_child'], left, level + 1), (node['right_child'], right, level + 1)]
+
+        nodes = _Nodes(
+            feature=np.asarray(columnas['feature'], dtype=np.intp),
+            threshold=np.asarray(columnas['threshold'], dtype=float),
+            default_left=np.asarray(columnas['default_left'], dtype=bool),
+            missing_type=np.asarray(columnas['missing_type'], dtype=np.int8),
+        )
+        nodes.left = np.asarray(columnas['left'], dtype=np.intp)
+        nodes.right = np.asarray(columnas['right'], dtype=np.intp)
+        nodes.value = np.asarray(columnas['value'], dtype=float)
+        nodes.count = np.asarray(columnas['count'], dtype=float)
+        roots = np.asarray(roots, dtype=np.intp)
+        tables = _decision_tables(nodes, roots) if depth <= TABLE_DEPTH else None
+        return cls(nodes, roots, max(depth, 1), tables, transform, scale, dump['max_feature_idx'] + 1)
+
+    def _raw_block(self, XT: np.ndarray, has_nan: bool) -> np.ndarray:
+        n = XT.shape[1]
+        if self.tables is not None:
+            leaf_values = np.take(self.tables[1], self._patterns(XT, has_nan) + self._table_offsets)
+        else:
+            nodes, flat, columns = self.nodes, XT.ravel(), np.arange(n)
+            node = np.repeat(self.roots[:, None], n, axis=1)
+            for _ in range(self.depth):
+                x = flat[nodes.feature[node] * n + columns]
+                go_left = nodes.go_left(x, XT.dtype, has_nan, node)
+                node = np.where(go_left, nodes.left[node], nodes.right[node])
+            leaf_values = nodes.value[node]
+        # Suma árbol por árbol, en el mismo orden que LightGBM
+        return np.add.reduce(leaf_values, axis=0)
+
+    def _patterns(self, XT: np.ndarray, has_nan: bool) -> np.ndarray:
+        # (árboles, filas) uint8: bit s = decisión del nodo s del montículo (7 bits caben en un byte)
+        heap = self.tables[0]
+        go_left = heap.go_left(np.take(XT, heap.feature, axis=0), XT.dtype, has_nan)
+        bits = go_left.reshape(-1, self.n_trees, XT.shape[1]).view(np.uint8)
+        pattern = bits[0].copy()
+        for slot in range(1, len(bits)):
+            pattern |= bits[slot] << slot
+        return pattern
+
+    def _blocks(self, X, width, fn) -> list:
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X[None, :]
+        if X.dtype != np.float32:
+            X = X.astype(np.float64, copy=False)
+        has_nan = bool(np.isnan(X).any())
+        block = max(1, BLOCK_ELEMENTS // width)
+        # Transpuesta (variables, filas): cada nodo lee una fila contigua
+        return [fn(np.ascontiguousarray(X[i:i + block].T), has_nan) for i in range(0, len(X), block)]
+
+    def predict_raw(self, X) -> np.ndarray:
+        width = len(self.tables[0].feature) if self.tables is not None else self.n_trees
+        blocks = self._blocks(X, width, self._raw_block)
+        return blocks[0] if len(blocks) == 1 else np.concatenate(blocks)
+
+    def predict_contrib(self, X) -> np.ndarray:
+        # Equivalente a Booster.predict(pred_contrib=True): (filas, variables + 1) en la escala del
+        # puntaje crudo, con el valor esperado en la última columna. Solo árboles con tabla.
+        if self.tables is None:
+            raise ValueError("Las contribuciones del backend numpy requieren árboles de profundidad <= "
+                             f"{TABLE_DEPTH}; use Booster.predict(pred_contrib=True)")
+        if self._contrib is None:
+            self._contrib = _contribution_tables(self.nodes, self.roots, self.tables[0], self.n_features)
+        flat, base, starts, features, expected = self._contrib
+
+        def block(XT, has_nan):
+            # Valor de cada par (árbol, variable local) según el patrón del árbol, ordenado por
+            # variable global: la suma por tramos da la contribución de cada variable
+            patterns = self._patterns(XT, has_nan).astype(np.intp)
+            values = np.take(flat, patterns[base[:, 0]] + base[:, 1:])
+            out = np.zeros((XT.shape[1], self.n_features + 1))
+            out[:, features] = np.add.reduceat(values, starts, axis=0).T
+            out[:, -1] = expected
+            return out
+
+        blocks = self._blocks(X, len(base), block)
+        return blocks[0] if len(blocks) == 1 else np.concatenate(blocks)
+
+    def predict(self, X) -> np.ndarray:
+        # Equivalente a Booster.predict: probabilidad para objetivos binarios
+        raw = self.predict_raw(X)
+        if self.transform == 'sigmoid':
+            return 1.0 / (1.0 + np.exp(-self.scale * raw))
+        return raw
+
+
+class _Nodes:
+    # Atributos de corte de un conjunto de nodos y la regla de decisión de LightGBM
+    def __init__(self, feature, threshold, default_left, missing_type):
+        self.feature = feature
+        self.threshold = threshold
+        self.threshold32 = _floor32(threshold)
+        self.default_left = default_left
+        self.missing_type = missing_type
+        self.has_zero = bool((missing_type == MISSING_TYPES['Zero']).any())
+
+    def go_left(self, x, dtype, has_nan, index=None):
+        # NumericalDecision de LightGBM. index: nodos por elemento (recorrido) o None cuando
+        # x ya está alineado con los nodos en el primer eje (tabla de decisiones)
+        def attr(values):
+            return values[index] if index is not None else values[:, None]
+
+        threshold = attr(self.threshold32 if dtype == np.float32 else self.threshold)
+        go_left = x <= threshold
+        if has_nan:
+            nan = np.isnan(x)
+            if nan.any():
+                # Sin missing_type NaN el faltante se evalúa como 0
+                cero_a_la_izquierda = np.broadcast_to(0.0 <= attr(self.threshold), x.shape)
+                go_left[nan] = cero_a_la_izquierda[nan]
+                usa_default = nan & (attr(self.missing_type) == MISSING_TYPES['NaN'])
+                go_left[usa_default] = np.broadcast_to(attr(self.default_left), x.shape)[usa_default]
+        if self.has_zero:
+            cero = np.abs(x) <= (_ZERO32 if dtype == np.float32 else ZERO_THRESHOLD)
+            if has_nan:
+                cero |= np.isnan(x)
+            usa_default = cero & (attr(self.missing_type) == MISSING_TYPES['Zero'])
+            go_left[usa_default] = np.broadcast_to(attr(self.default_left), x.shape)[usa_default]
+        return go_left
+
+
+def _floor32(values: np.ndarray) -> np.ndarray:
+    # Para entradas float32: x <= t equivale a x <= (mayor float32 <= t), sin convertir x a double
+    # Umbrales fuera del rango float32 (±1e300 de LightGBM) pasan a ±inf sin aviso de overflow;
+    # el ajuste de abajo deja +1e300 en el máximo float32
+    values = np.asarray(values, dtype=float)
+    with np.errstate(over='ignore'):
+        floor = values.astype(np.float32)
+    exceso = floor.astype(float) > values
+    floor[exceso] = np.nextafter(floor[exceso], np.float32(-np.inf))
+    return floor
+
+
+_ZERO32 = _floor32([ZERO_THRESHOLD])[0]
+
+
+def _append_node(columnas) -> int:
+    for key, default in (('feature', 0), ('threshold', np.inf), ('default_left', True),
+                         ('missing_type', 0), ('left', -1), ('right', -1), ('value', 0.0), ('count', 0)):
+        columnas[key].append(default)
+    return len(columnas['feature']) - 1
+
+
+def _decision_tables(nodes: _Nodes, roots: np.ndarray) -> tuple:
+    # Montículo completo de profundidad TABLE_DEPTH por árbol: el nodo s del árbol t queda en la
+    # fila s * T + t. Las hojas antes del último nivel se propagan como cortes neutros (x <= inf).
+    n_internal = (1 << TABLE_DEPTH) - 1
+    index = _heap_index(nodes, roots)[:n_internal]
+    es_hoja = nodes.left[index] == index
+    heap = _Nodes(
+        feature=np.where(es_hoja, 0, nodes.feature[index]).ravel(),
+        threshold=np.where(es_hoja, np.inf, nodes.threshold[index]).ravel(),
+        default_left=np.where(es_hoja, True, nodes.default_left[index]).ravel(),
+        missing_type=np.where(es_hoja, 0, nodes.missing_type[index]).ravel(),
+    )
+
+    # Tabla (árbol, patrón de bits) -> valor de la hoja alcanzada; con un corte neutro ambos
+    # hijos son la misma hoja, de modo que el bit correspondiente no altera el resultado
+    patterns = np.arange(1 << n_internal)
+    node = np.repeat(roots[:, None], len(patterns), axis=1)
+    slot = np.zeros(len(patterns), dtype=np.intp)
+    for _ in range(TABLE_DEPTH):
+        bit = (patterns >> np.minimum(slot, n_internal - 1)) & 1
+        node = np.where(bit == 1, nodes.left[node], nodes.right[node])
+        slot = 2 * slot + 2 - bit
+    return heap, nodes.value[node]
+
+
+def _heap_index(nodes: _Nodes, roots: np.ndarray) -> np.ndarray:
+    # Nodo en cada posición del montículo completo de profundidad TABLE_DEPTH (internos y hojas):
+    # una hoja antes del último nivel se repite en sus dos hijos
+    index = np.empty(((2 << TABLE_DEPTH) - 1, len(roots)), dtype=np.intp)
+    index[0] = roots
+    for slot in range(1, len(index)):
+        parent = index[(slot - 1) // 2]
+        index[slot] = np.where(slot % 2 == 1, nodes.left[parent], nodes.right[parent])
+    return index
+
+
+def _contribution_tables(nodes: _Nodes, roots: np.ndarray, heap: _Nodes, n_features: int) -> tuple:
+    # TreeSHAP (dependiente del camino, como LightGBM) tabulado por patrón de decisiones. En un
+    # árbol de profundidad <= 3 el valor de una coalición S sigue la decisión de la fila en los
+    # nodos cuya variable está en S y promedia los hijos por cobertura (conteo de datos) en el
+    # resto, así que depende solo del patrón de 7 bits: se evalúan las 128 coaliciones de las
+    # (a lo sumo 7) variables locales del árbol para los 128 patrones y se aplican los pesos de
+    # Shapley. Resultado: contribución por (árbol, variable local, patrón).
+    n_internal, n_trees = (1 << TABLE_DEPTH) - 1, len(roots)
+    n_patterns = 1 << n_internal
+    index = _heap_index(nodes, roots)
+    es_neutro = nodes.left[index[:n_internal]] == index[:n_internal]
+    feature = heap.feature.reshape(n_internal, n_trees)
+
+    # Variable local de cada nodo del montículo (-1: corte neutro) y variables globales por árbol
+    local = np.full((n_internal, n_trees), -1, dtype=np.intp)
+    global_features = np.full((n_trees, n_internal), -1, dtype=np.intp)
+    for t in range(n_trees):
+        usadas = list(dict.fromkeys(feature[~es_neutro[:, t], t].tolist()))
+        global_features[t, :len(usadas)] = usadas
+        for slot in np.flatnonzero(~es_neutro[:, t]):
+            local[slot, t] = usadas.index(feature[slot, t])
+    m = (global_features >= 0).sum(axis=1)
+
+    coaliciones = np.arange(n_patterns)
+    patterns = np.arange(n_patterns)
+    count = nodes.count[index]
+    # Valor de cada posición del montículo: (árboles, coaliciones, patrones), de las hojas a la raíz
+    value = [None] * len(index)
+    for slot in range(len(index) - 1, n_internal - 1, -1):
+        value[slot] = np.broadcast_to(nodes.value[index[slot]][:, None, None], (n_trees, 1, 1))
+    for slot in range(n_internal - 1, -1, -1):
+        left, right = value[2 * slot + 1], value[2 * slot + 2]
+        c_left, c_right = count[2 * slot + 1], count[2 * slot + 2]
+        total = c_left + c_right
+        w_left = np.divide(c_left, total, out=np.full(n_trees, 0.5), where=total > 0)[:, None, None]
+        promedio = w_left * left + (1.0 - w_left) * right
+        en_s = ((coaliciones[None, :] >> np.maximum(local[slot], 0)[:, None]) & 1).astype(bool)
+        en_s &= (local[slot] >= 0)[:, None]
+        bit = ((patterns >> slot) & 1).astype(bool)
+        sigue = np.where(bit[None, None, :], left, right)
+        value[slot] = np.where(en_s[:, :, None], sigue, promedio)
+    root = value[0]
+
+    # Pesos de Shapley |S|! (m - |S| - 1)! / m! para S sin la variable i dentro de las m del árbol
+    from math import factorial
+
+    tamano = np.array([bin(c).count('1') for c in coaliciones])
+    pesos = np.zeros((n_internal + 1, n_patterns))
+    for mi in range(1, n_internal + 1):
+        validas = coaliciones < (1 << mi)
+        pesos[mi, validas] = [factorial(k) * factorial(mi - k - 1) / factorial(mi) if k < mi else 0.0
+                              for k in tamano[validas]]
+    contrib = np.zeros((n_trees, n_internal, n_patterns))
+    for i in range(n_internal):
+        sin_i = (coaliciones >> i) & 1 == 0
+        w = pesos[m][:, sin_i] * (i < m)[:, None]
+        diferencia = root[:, coaliciones[sin_i] | (1 << i)] - root[:, sin_i]
+        contrib[:, i] = np.einsum('ts,tsp->tp', w, diferencia)
+    expected = float(root[:, 0, 0].sum())
+
+    # Pares (árbol, variable local) válidos ordenados por variable global
+    t_idx, i_idx = np.nonzero(global_features >= 0)
+    orden = np.argsort(global_features[t_idx, i_idx], kind='stable')
+    t_idx, i_idx = t_idx[orden], i_idx[orden]
+    globales = global_features[t_idx, i_idx]
+    features, starts = np.unique(globales, return_index=True)
+    # base[:, 0]: árbol (fila de patrones); base[:, 1]: desplazamiento en la tabla aplanada
+    base = np.column_stack([t_idx, (t_idx * n_internal + i_idx) * n_patterns])
+    return contrib.ravel(), base, starts, features, expected
+
+
+def _output_transform(objective: str) -> tuple:
+    # 'binary sigmoid:1' -> ('sigmoid', 1.0); regresión -> identidad
+    nombre, *params = objective.split()
+    if nombre in ('binary', 'cross_entropy', 'xentropy'):
+        scale = 1.0
+        for param in params:
+            if param.startswith('sigmoid:'):
+                scale = float(param.split(':', 1)[1])
+        return 'sigmoid', scale
+    if nombre in ('regression', 'regression_l2', 'regression_l1', 'huber', 'fair', 'quantile', 'mape'):
+        return 'identity', 1.0
+    raise ValueError(f"Objetivo de LightGBM no soportado por el backend numpy: {objective}")
@@ -0,0 +1,126 @@
+# Cliente de la API de predicción: el archivo se divide en partes por líneas completas, cada
+# parte se comprime con gzip y se envía en paralelo sobre una sesión con pool de conexiones y
+# reintentos; los resultados se unen en el orden original.
+import gzip
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+API_URL = os.environ.get('API_URL', "https://prueba-ifrs9.onrender.com/predict/")
+CHUNK_BYTES = int(os.environ.get('PREDICT_CHUNK_MB', 4)) * 1024 ** 2
+WORKERS = int(os.environ.get('PREDICT_WORKERS', 4))
+# (conexión, lectura) en segundos por parte
+TIMEOUT = (10, 300)
+
+
+def dividir_csv(data: bytes, chunk_bytes=CHUNK_BYTES) -> list:
+    # Partes de ~chunk_bytes cortadas en fin de línea, cada una con el encabezado del archivo
+    fin_encabezado = data.find(b'\n') + 1
+    if not fin_encabezado:
+        return [data]
+    encabezado = data[:fin_encabezado]
+    partes, inicio = [], fin_encabezado
+    while inicio < len(data):
+        fin = data.find(b'\n', min(inicio + chunk_bytes, len(data)) - 1) + 1 or len(data)
+        if data[inicio:fin].strip():
+            partes.append(encabezado + data[inicio:fin])
+        inicio = fin
+    return partes
+
+
+def leer_arrow(content: bytes) -> pd.DataFrame:
+    import pyarrow as pa
+
+    if not content:
+        return pd.DataFrame(columns=['num_doc', 'probabilidad', 'grupo_riesgo'])
+    return pa.ipc.open_stream(content).read_pandas()
+
+
+class ClienteAPI:
+    def __init__(self, url=API_URL, workers=WORKERS, chunk_bytes=CHUNK_BYTES, reintentos=3, timeout=TIMEOUT):
+        self.url = url
+        self.workers = workers
+        self.chunk_bytes = chunk_bytes
+        self.timeout = timeout
+        # Puntuar es idempotente, pero una parte lenta no se reenvía: solo se reintenta el POST
+        # si no llegó a conectar o si la API (o el proxy) lo rechaza por sobrecarga; nunca tras
+        # agotar el tiempo de lectura, que solo sumaría carga a una API ya lenta
+        retry = Retry(total=reintentos, connect=reintentos, read=0, other=0, backoff_factor=0.5,
+                      status_forcelist=(429, 502, 503, 504), allowed_methods=None, raise_on_status=False)
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_maxsize=workers, max_retries=retry))
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=workers, max_retries=retry))
+
+    def _enviar(self, i, parte: bytes) -> pd.DataFrame:
+        files = {'file': (f'parte_{i}.csv.gz', gzip.compress(parte, compresslevel=5), 'application/gzip')}
+        response = self.session.post(self.url, files=files, params={'formato': 'arrow'}, timeout=self.timeout)
+        if response.status_code != 200:
+            try:
+                detalle = response.json().get('detail')
+            except ValueError:
+                detalle = response.text[:200]
+            raise RuntimeError(f"Error {response.status_code} en la parte {i + 1}: {detalle}")
+        return leer_arrow(response.content)
+
+    def puntuar(self, data: bytes, progreso=None) -> pd.DataFrame:
+        # progreso(partes_terminadas, total_partes) se llama desde el hilo que invoca puntuar
+        return _puntuar_partes(dividir_csv(data, self.chunk_bytes), self._enviar, self.workers, progreso)
+
+    def close(self):
+        self.session.close()
+
+
+class PuntuadorLocal:
+    # Modo sin API: puntúa en el proceso con RiskPredictor (misma división y progreso por partes)
+    def __init__(self, chunk_bytes=CHUNK_BYTES):
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        src_path = os.path.join(base_dir, 'src')
+        if src_path not in sys.path:
+            sys.path.insert(0, src_path)
+        from config import MODEL_PATH
+        try:
+            from predict import RiskPredictor
+        except ImportError as exc:
+            raise RuntimeError(f"El modo local requiere las dependencias del modelo ({exc.name}); "
+                               "instale webapp/requirements.txt o use el modo API") from exc
+
+        self.predictor = RiskPredictor(MODEL_PATH)
+        self.chunk_bytes = chunk_bytes
+
+    def _puntuar_parte(self, i, parte: bytes) -> pd.DataFrame:
+        from schema import read_raw
+
+        return self.predictor.predict_from_dataframe(read_raw(io.BytesIO(parte)))
+
+    def puntuar(self, data: bytes, progreso=None) -> pd.DataFrame:
+        # Un solo hilo: el booster ya usa todos los núcleos en cada parte
+        return _puntuar_partes(dividir_csv(data, self.chunk_bytes), self._puntuar_parte, 1, progreso)
+
+
+def _puntuar_partes(partes, puntuar_parte, workers, progreso=None) -> pd.DataFrame:
+    resultados = [None] * len(partes)
+    if progreso is not None:
+        progreso(0, len(partes))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(puntuar_parte, i, parte): i for i, parte in enumerate(partes)}
+        try:
+            for hechas, future in enumerate(as_completed(futures), start=1):
+                resultados[futures[future]] = future.result()
+                if progreso is not None:
+                    progreso(hechas, len(partes))
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    if not resultados:
+        return leer_arrow(b'')
+    df = pd.concat(resultados, ignore_index=True)
+    # Las partes pueden traer categorías distintas: se unifican para los resúmenes
+    df['grupo_riesgo'] = df['grupo_riesgo'].astype(str)
+    return df
@@ -1,10 +1,47 @@
 # app_streamlit.py
+import hashlib
+import io
+import os
+
 import streamlit as st
 import pandas as pd
-import requests
-import io
 
-API_URL = "https://prueba-ifrs9.onrender.com/predict/"
+from cliente_api import API_URL, ClienteAPI, PuntuadorLocal
+
+MODOS = ("API", "Local (sin API)")
+
+
+@st.cache_resource
+def cliente_api(url):
+    # Una sesión con pool de conexiones por URL, compartida entre reruns y usuarios
+    return ClienteAPI(url)
+
+
+@st.cache_resource
+def puntuador_local():
+    return PuntuadorLocal()
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def puntuar(file_hash, modo, api_url, _data, _progreso):
+    # Clave: hash del archivo, modo y URL (los argumentos con _ no se hashean)
+    motor = puntuador_local() if modo == MODOS[1] else cliente_api(api_url)
+    return motor.puntuar(_data, progreso=_progreso)
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def exportes(file_hash, modo, api_url, _df_result):
+    resumen = (
+        _df_result.groupby("grupo_riesgo")
+        .size()
+        .reset_index(name="cantidad")
+        .sort_values(by="grupo_riesgo")
+    )
+    csv = _df_result.to_csv(index=False).encode("utf-8")
+    output = io.BytesIO()
+    resumen.to_excel(output, index=False, engine='openpyxl')
+    return resumen, csv, output.getvalue()
+
 
 st.title("📊 Clasificador de Riesgo de Crédito")
 
@@ -12,52 +49,53 @@ st.markdown("""
 Carga un archivo `.csv` (separado por pipe `|`) para obtener las probabilidades de incumplimiento y la clasificación en grupos de riesgo `t1` a `t8`.
 """)
 
+modo = st.radio("Modo de puntuación", MODOS, horizontal=True,
+                index=1 if os.environ.get('PREDICT_MODE') == 'local' else 0,
+                help="Local puntúa en este proceso con el modelo de models/, sin llamar a la API")
+api_url = st.text_input("URL de la API", API_URL) if modo == MODOS[0] else None
+
 uploaded_file = st.file_uploader("📁 Subir archivo base_prueba.csv", type=["csv"])
 
 if uploaded_file:
-    if st.button("🚀 Enviar a la API"):
-        with st.spinner("Enviando a la API..."):
-            try:
-                files = {'file': (uploaded_file.name, uploaded_file.getvalue())}
-                response = requests.post(API_URL, files=files)
-
-                if response.status_code == 200:
-                    data = response.json()
-                    df_result = pd.DataFrame(data)
-
-                    st.success("✅ Clasificación completada")
-                    st.dataframe(df_result)
-
-                    resumen = (
-                        df_result.groupby("grupo_riesgo")
-                        .size()
-                        .reset_index(name="cantidad")
-                        .sort_values(by="grupo_riesgo")
-                    )
-                    st.subheader("📈 Resumen por grupo de riesgo")
-                    st.table(resumen)
-
-                    csv = df_result.to_csv(index=False).encode("utf-8")
-                    st.download_button(
-                        label="📥 Descargar resultados como CSV",
-                        data=csv,
-                        file_name="predicciones_riesgo.csv",
-                        mime="text/csv"
-                    )
-
-                    output = io.BytesIO()
-                    resumen.to_excel(output, index=False, engine='openpyxl')
-                    output.seek(0)
-
-                    st.download_button(
-                        label="📥 Descargar resumen como Excel",
-                        data=output,
-                        file_name="resumen_riesgo.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                    )
-
-                else:
-                    st.error(f"❌ Error {response.status_code}: {response.json().get('error')}")
-
-            except Exception as e:
-                st.error(f"⚠️ Error al conectar con la API: {e}")
+    data = uploaded_file.getvalue()
+    clave = (hashlib.sha256(data).hexdigest(), modo, api_url)
+
+    if st.button("🚀 Enviar a la API" if modo == MODOS[0] else "🚀 Puntuar localmente"):
+        barra = st.progress(0.0, text="Enviando a la API..." if modo == MODOS[0] else "Puntuando...")
+
+        def progreso(hechas, total):
+            barra.progress(hechas / total if total else 1.0, text=f"Parte {hechas} de {total}")
+
+        try:
+            puntuar(*clave, data, progreso)
+            st.session_state['prediccion'] = clave
+        except Exception as e:
+            st.session_state.pop('prediccion', None)
+            st.error(f"⚠️ Error al conectar con la API: {e}" if modo == MODOS[0] else f"⚠️ Error al puntuar: {e}")
+        finally:
+            barra.empty()
+
+    # Los resultados se conservan entre reruns (p. ej. al descargar) sin volver a puntuar
+    if st.session_state.get('prediccion') == clave:
+        df_result = puntuar(*clave, data, None)
+        resumen, csv, excel = exportes(*clave, df_result)
+
+        st.success("✅ Clasificación completada")
+        st.dataframe(df_result)
+
+        st.subheader("📈 Resumen por grupo de riesgo")
+        st.table(resumen)
+
+        st.download_button(
+            label="📥 Descargar resultados como CSV",
+            data=csv,
+            file_name="predicciones_riesgo.csv",
+            mime="text/csv"
+        )
+
+        st.download_button(
+            label="📥 Descargar resumen como Excel",
+            data=excel,
+            file_name="resumen_riesgo.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )